@@ -30,10 +30,12 @@
         'data/bangladesh.districts.csv',
         'data/bangladesh.upazilas.csv',
         'data/bangladesh.unions.csv',
+        'data/ir_cron_data.xml',
         'views/customer_commission_config_views.xml',
         'views/res_partner_views.xml',
         'views/res_company_address_views.xml',
         'views/customer_commission_views.xml',
+        'views/customer_commission_ledger_views.xml',
         'views/sale_order_views.xml',
         'views/account_move_views.xml',
         'views/product_template_views.xml',
@@ -50,6 +52,7 @@
         'views/hide_menues_from_sales_setting.xml',
         'views/sale_order_template_inherit.xml',
         'views/product_pricelist.xml',
+        'views/db_sync_outbox_views.xml',
         'wizard/send_whatsapp_sale_wizard_views.xml',
     ],
     # only loaded in demonstration mode
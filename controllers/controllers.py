@@ -1,22 +1,16 @@
 # -*- coding: utf-8 -*-
-# from odoo import http
+from odoo import http
+from odoo.http import request
 
 
-# class DbSync(http.Controller):
-#     @http.route('/db_sync/db_sync', auth='public')
-#     def index(self, **kw):
-#         return "Hello, world"
-
-#     @http.route('/db_sync/db_sync/objects', auth='public')
-#     def list(self, **kw):
-#         return http.request.render('db_sync.listing', {
-#             'root': '/db_sync/db_sync',
-#             'objects': http.request.env['db_sync.db_sync'].search([]),
-#         })
-
-#     @http.route('/db_sync/db_sync/objects/<model("db_sync.db_sync"):obj>', auth='public')
-#     def object(self, obj, **kw):
-#         return http.request.render('db_sync.object', {
-#             'object': obj
-#         })
+class SyncMetricsController(http.Controller):
 
+    @http.route('/purchase_commission/sync_metrics', type='http', auth='user')
+    def sync_metrics(self, **kw):
+        """Synchronization metrics in the Prometheus text format"""
+        if not request.env.user.has_group('base.group_system'):
+            return request.not_found()
+        return request.make_response(request.env['db.sync.metric']._get_metrics_text(), headers=[
+            ('Content-Type', 'text/plain; version=0.0.4; charset=utf-8'),
+            ('Content-Disposition', 'inline; filename="sync_metrics.prom"'),
+        ])
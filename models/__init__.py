@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 
+from . import account_fiscal_year
 from . import customer_commission_config
 from . import res_partner
 from . import customer_commission
+from . import customer_commission_ledger
+from . import customer_commission_queue
+from . import account_payment
 from . import account_move
 from . import sale_order_line
 from . import sale_order
@@ -19,6 +23,15 @@ from . import product_supplierinfo
 from . import product_attribute
 from . import attribute_value
 from . import db_sync
+from . import db_sync_outbox
+from . import db_sync_mapping
+from . import db_sync_watermark
+from . import db_sync_reconciliation
+from . import db_sync_reconciliation_line
+from . import db_sync_pull
+from . import db_sync_metric
+from . import db_sync_plan
+from . import db_sync_plan_line
 from . import inherited_account
 from . import product_category
 from . import product_product
@@ -0,0 +1,48 @@
+import bisect
+
+from odoo import models, fields, api, tools
+
+
+class AccountFiscalYear(models.Model):
+    _inherit = 'account.fiscal.year'
+
+    commission_close_requested = fields.Boolean(
+        string='Commission Close Requested', copy=False,
+        help="Eligible customer commissions of this fiscal year are waiting to be paid by the year-end close job")
+
+    @api.model
+    @tools.ormcache('company_id')
+    def _get_fiscal_year_index(self, company_id):
+        """Start dates, end dates and ids of the company fiscal years, sorted by start date."""
+        fiscal_years = self.sudo().search([('company_id', '=', company_id)], order='date_from')
+        return (
+            tuple(fiscal_years.mapped('date_from')),
+            tuple(fiscal_years.mapped('date_to')),
+            tuple(fiscal_years.ids),
+        )
+
+    @api.model
+    def _find_fiscal_year(self, company, date):
+        """Fiscal year of the company containing the date, resolved from the cached index."""
+        if not company or not date:
+            return self.browse()
+        date = fields.Date.to_date(date)
+        date_froms, date_tos, ids = self._get_fiscal_year_index(company.id)
+        index = bisect.bisect_right(date_froms, date) - 1
+        if index >= 0 and date <= date_tos[index]:
+            return self.browse(ids[index])
+        return self.browse()
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.env.registry.clear_cache()
+        return super().create(vals_list)
+
+    def write(self, vals):
+        if {'date_from', 'date_to', 'company_id'}.intersection(vals):
+            self.env.registry.clear_cache()
+        return super().write(vals)
+
+    def unlink(self):
+        self.env.registry.clear_cache()
+        return super().unlink()
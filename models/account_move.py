@@ -1,42 +1,95 @@
+from collections import Counter
+import logging
+
 from odoo import api, fields, models
 from odoo.tools.misc import format_amount
 
+_logger = logging.getLogger(__name__)
+
+# written fields of account.move a customer commission depends on. The amounts
+# are computed from the lines and never written, their changes come with line_ids
+# or invoice_line_ids; the payments are tracked by account.payment.
+COMMISSION_TRIGGER_FIELDS = frozenset({
+    'state', 'partner_id', 'invoice_date', 'company_id', 'move_type',
+    'line_ids', 'invoice_line_ids',
+})
+# per worker counters of the commission hook of AccountMove.write
+COMMISSION_HOOK_STATS = Counter()
+
 
 class AccountMove(models.Model):
     _inherit = 'account.move'
     commission_id = fields.Many2one('customer.commission', string='Customer Commission', readonly=True, copy=False)
 
-    def write(self, vals):
+    def _get_commission_keys(self):
+        """(partner_id, fiscal_year_id, company_id) of the commissions the customer invoices contribute to."""
+        Ledger = self.env['customer.commission.ledger'].sudo()
+        keys = set()
         for move in self:
-            if move.move_type in ['out_invoice']:
-                partner = move.partner_id
-                # Find the current fiscal year
-                fiscal_year = self.env['account.fiscal.year'].search([
-                    ('date_from', '<=', move.invoice_date),
-                    ('date_to', '>=', move.invoice_date),
-                    ('company_id', '=', move.company_id.id)
-                ], limit=1)
-
-                if fiscal_year and partner:
-                    # Check if commission record exists
-                    commission = self.env['customer.commission'].search([
-                        ('partner_id', '=', partner.id),
-                        ('fiscal_year_id', '=', fiscal_year.id),
-                        ('company_id', '=', move.company_id.id)
-                    ], limit=1)
-
-                    if not commission:
-                        # Create a new commission record
-                        new_commission_record = self.env['customer.commission'].create({
-                            'partner_id': partner.id,
-                            'fiscal_year_id': fiscal_year.id,
-                            'company_id': move.company_id.id,
-                            'state': 'draft'
-                        })
-                        new_commission_record.recompute_all()
-                    else:
-                        commission.recompute_all()
-        return super(AccountMove, self).write(vals)
+            if move.move_type in ['out_invoice'] and move.partner_id and move.invoice_date:
+                fiscal_year = Ledger._get_fiscal_year(move.company_id, move.invoice_date)
+                if fiscal_year:
+                    keys.add((move.partner_id.id, fiscal_year.id, move.company_id.id))
+        return keys
+
+    def _commission_fields_changed(self, vals):
+        """Whether vals actually changes a commission relevant field of a customer invoice."""
+        invoices = self.filtered(lambda move: move.move_type in ['out_invoice'])
+        if 'move_type' in vals and vals['move_type'] == 'out_invoice':
+            invoices = self
+        for fname in COMMISSION_TRIGGER_FIELDS.intersection(vals):
+            field = self._fields[fname]
+            if field.type in ('one2many', 'many2many'):
+                if invoices:
+                    return True
+                continue
+            value = vals[fname]
+            if field.type == 'many2one':
+                value = value or False
+            elif field.type == 'date':
+                value = fields.Date.to_date(value)
+            for move in invoices:
+                current = move[fname].id if field.type == 'many2one' else move[fname]
+                if current != value:
+                    return True
+        return False
+
+    @api.model
+    def get_commission_hook_stats(self):
+        """Number of writes the commission hook processed and skipped in this worker."""
+        return {'processed': COMMISSION_HOOK_STATS['processed'], 'skipped': COMMISSION_HOOK_STATS['skipped']}
+
+    def write(self, vals):
+        if not self._commission_fields_changed(vals):
+            COMMISSION_HOOK_STATS['skipped'] += 1
+            return super(AccountMove, self).write(vals)
+        COMMISSION_HOOK_STATS['processed'] += 1
+        _logger.debug("Commission hook processing write of %s on %s", list(vals), self)
+        # enqueue the keys before and after the write, partner or date may change
+        keys = self._get_commission_keys()
+        res = super(AccountMove, self).write(vals)
+        keys |= self._get_commission_keys()
+        self.env['customer.commission.queue'].sudo()._enqueue(keys)
+        return res
+
+    def _update_commission_ledger(self, sign=1):
+        """Add (or remove, with sign=-1) the amounts of posted invoices to the commission ledger."""
+        self.env['customer.commission.ledger'].sudo()._add_entries(
+            (move.partner_id, move.company_id, move.invoice_date, {'total_invoiced': sign * move.amount_total})
+            for move in self
+        )
+
+    def _post(self, soft=True):
+        posted = super()._post(soft)
+        posted.filtered(lambda move: move.move_type == 'out_invoice')._update_commission_ledger()
+        return posted
+
+    def button_draft(self):
+        posted = self.filtered(lambda move: move.move_type == 'out_invoice' and move.state == 'posted')
+        res = super().button_draft()
+        # once reset, the invoices are left out of the totals seeding a missing ledger row
+        posted.filtered(lambda move: move.state != 'posted')._update_commission_ledger(sign=-1)
+        return res
 
     def _report_paginated_lines(self, first_page_count=22, other_page_count=30):
 
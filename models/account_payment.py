@@ -0,0 +1,38 @@
+from odoo import models
+
+
+class AccountPayment(models.Model):
+    _inherit = 'account.payment'
+
+    def _update_commission_ledger(self, sign=1):
+        """Add (or remove, with sign=-1) the amounts of paid customer payments to the commission ledger."""
+        self.env['customer.commission.ledger'].sudo()._add_entries(
+            (payment.partner_id, payment.company_id, payment.date, {'total_paid': sign * payment.amount})
+            for payment in self if payment.payment_type == 'inbound'
+        )
+
+    def _get_commission_keys(self):
+        """(partner_id, fiscal_year_id, company_id) of the commissions the customer payments contribute to."""
+        Ledger = self.env['customer.commission.ledger'].sudo()
+        keys = set()
+        for payment in self.filtered(lambda payment: payment.payment_type == 'inbound' and payment.partner_id):
+            fiscal_year = Ledger._get_fiscal_year(payment.company_id, payment.date)
+            if fiscal_year:
+                keys.add((payment.partner_id.id, fiscal_year.id, payment.company_id.id))
+        return keys
+
+    def _compute_state(self):
+        super()._compute_state()
+        # payments are paid by the reconciliation of their move without a write,
+        # the queue refreshes their ledger from the documents
+        self.env['customer.commission.queue'].sudo()._enqueue(self.filtered('id')._get_commission_keys())
+
+    def write(self, vals):
+        if 'state' not in vals:
+            return super().write(vals)
+        paid_before = self.filtered(lambda payment: payment.state == 'paid')
+        res = super().write(vals)
+        paid_after = self.filtered(lambda payment: payment.state == 'paid')
+        (paid_after - paid_before)._update_commission_ledger()
+        (paid_before - paid_after)._update_commission_ledger(sign=-1)
+        return res
@@ -1,9 +1,11 @@
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError
+import logging
+_logger = logging.getLogger(__name__)
 
 
 class ProductAttributeValue(models.Model):
-    _inherit = 'product.attribute.value'
+    _inherit = ['product.attribute.value', 'db.sync.mixin']
 
     @api.constrains('name')
     def _check_unique_name(self):
@@ -15,4 +17,41 @@ class ProductAttributeValue(models.Model):
                      ('attribute_id', '=', value.attribute_id.id),
                      ('name', '=ilike', value.name)])
                 if existing:
-                    raise ValidationError("An attribute value with the same name already exists for this attribute.")
\ No newline at end of file
+                    raise ValidationError("An attribute value with the same name already exists for this attribute.")
+
+    def _get_remote_value_ids(self, remote_models, config, create_missing=False):
+        """Remote IDs of the values of self keyed by local ID, from the mapping table.
+        Values not mapped yet are matched once on the remote side by attribute and
+        name (optionally created there) and recorded in the mapping table."""
+        Mapping = self.env['db.sync.mapping'].sudo()
+        remote_ids = Mapping._get_remote_ids(self._name, self.ids)
+        missing = self.filtered(lambda value: value.id not in remote_ids and value.attribute_id.remote_attribute_id)
+        if not missing:
+            return remote_ids
+        db = config['db']
+        uid = config['uid']
+        password = config['password']
+        records = remote_models.execute_kw(
+            db, uid, password, 'product.attribute.value', 'search_read',
+            [[['attribute_id', 'in', missing.attribute_id.mapped('remote_attribute_id')],
+              ['name', 'in', missing.mapped('name')]]],
+            {'fields': ['name', 'attribute_id']}
+        )
+        existing_records = {(record['attribute_id'][0], record['name'].lower()): record['id'] for record in records}
+        pairs = []
+        to_create = []
+        for value in missing:
+            remote_id = existing_records.get((value.attribute_id.remote_attribute_id, value.name.lower()))
+            if remote_id:
+                pairs.append((value.id, remote_id))
+            elif create_missing:
+                to_create.append(value)
+        if to_create:
+            _logger.info(f"Creating remote attribute values: {[value.name for value in to_create]}")
+            created_ids = remote_models.execute_kw(db, uid, password, 'product.attribute.value', 'create', [[
+                {'name': value.name, 'attribute_id': value.attribute_id.remote_attribute_id} for value in to_create
+            ]])
+            pairs += [(value.id, remote_id) for value, remote_id in zip(to_create, created_ids)]
+        Mapping._map(self._name, pairs)
+        remote_ids.update(pairs)
+        return remote_ids
@@ -1,5 +1,11 @@
-from odoo import models, fields, api
+from collections import defaultdict
+import logging
+
+from odoo import models, fields, api, tools
 from odoo.exceptions import ValidationError
+from odoo.addons.purchase_commission.models.customer_commission_ledger import TOTAL_FIELDS
+
+_logger = logging.getLogger(__name__)
 
 
 class CustomerCommission(models.Model):
@@ -8,7 +14,7 @@ class CustomerCommission(models.Model):
     _order = 'fiscal_year_id desc'
 
     name = fields.Char(string='Name', compute='_compute_name')
-    partner_id = fields.Many2one('res.partner', string='Customer', required=True)
+    partner_id = fields.Many2one('res.partner', string='Customer', required=True, index=True)
     commission_rule_id = fields.Many2one(
         'customer.commission.config', string='Commission Rule')
     commission_amount = fields.Float(string='Commission Amount', compute='_compute_commission_amount', store=True)
@@ -18,21 +24,25 @@ class CustomerCommission(models.Model):
         ('eligible', 'Eligible'),
         ('in_payment', 'In Payment'),
         ('paid', 'Paid')
-    ], string='Status', default='draft', compute='_compute_state', required=True)
+    ], string='Status', default='draft', compute='_compute_state', store=True, index=True, required=True)
     company_id = fields.Many2one('res.company', string='Company',
                                  default=lambda self: self.env.company)
     fiscal_year_id = fields.Many2one(
         'account.fiscal.year',
         string='Fiscal Year',
-        help="Fiscal year for which this commission is recorded"
+        help="Fiscal year for which this commission is recorded",
+        index=True
     )
+    ledger_id = fields.Many2one('customer.commission.ledger', string='Ledger', compute='_compute_ledger_id',
+                                store=True, index=True)
     total_own_product_purchase = fields.Float(string='Total Own Product Purchases This Year',
-                                              compute='_compute_total_own_product_purchase')
-    total_purchase = fields.Float(string='Total Purchases This Year', compute='_compute_total_purchase')
-    total_invoiced = fields.Float(string='Total Invoiced This Year', compute='_compute_total_invoiced')
-    total_paid = fields.Float(string='Total Paid This Year', compute='_compute_total_paid')
-    total_due = fields.Float(string='Total Due This Year', compute='_compute_total_due')
-    invoice_count = fields.Integer(compute='_compute_invoice_count')
+                                              compute='_compute_totals', store=True)
+    total_purchase = fields.Float(string='Total Purchases This Year', compute='_compute_totals', store=True)
+    total_invoiced = fields.Float(string='Total Invoiced This Year', compute='_compute_totals', store=True)
+    total_paid = fields.Float(string='Total Paid This Year', compute='_compute_totals', store=True)
+    total_due = fields.Float(string='Total Due This Year', compute='_compute_total_due', store=True)
+    credit_note_ids = fields.One2many('account.move', 'commission_id', string='Credit Notes')
+    invoice_count = fields.Integer(compute='_compute_invoice_count', store=True)
     payment_date = fields.Date(string='Payment Date', compute='_compute_payment_date', store=True)
     account_move_id = fields.Many2one('account.move', string='Credit Note', readonly=True)
 
@@ -44,17 +54,14 @@ class CustomerCommission(models.Model):
                 if record.payment_date < record.fiscal_year_id.date_to:
                     raise ValidationError("Payment date must be after the fiscal year end date!")
 
+    def init(self):
+        tools.create_index(self.env.cr, 'customer_commission_partner_fiscal_year_state_idx',
+                           self._table, ['partner_id', 'fiscal_year_id', 'state'])
+
+    @api.depends('credit_note_ids.move_type')
     def _compute_invoice_count(self):
         for record in self:
-            if record.partner_id:
-                invoices = self.env['account.move'].search([
-                    ('partner_id', '=', record.partner_id.id),
-                    ('move_type', 'in', ['out_refund']),
-                    ('commission_id', '=', record.id)
-                ])
-                record.invoice_count = len(invoices)
-            else:
-                record.invoice_count = 0
+            record.invoice_count = len(record.credit_note_ids.filtered(lambda move: move.move_type == 'out_refund'))
 
     def action_view_credit_notes(self):
         self.ensure_one()
@@ -74,7 +81,7 @@ class CustomerCommission(models.Model):
             else:
                 record.name = "New Commission Record"
 
-    @api.depends('commission_rule_id', 'total_purchase', 'total_invoiced', 'total_paid', 'total_due')
+    @api.depends('commission_rule_id.commission_percent', 'total_own_product_purchase')
     def _compute_commission_amount(self):
         for record in self:
             if record.commission_rule_id:
@@ -89,26 +96,23 @@ class CustomerCommission(models.Model):
         self.action_update_commission_rules()
 
     def action_update_commission_rules(self):
+        CommissionConfig = self.env['customer.commission.config']
+        ids_by_rule = defaultdict(list)
         for record in self:
             if record.partner_id and record.fiscal_year_id:
-                commission_rules = self.env['customer.commission.config'].search([
-                    ('purchase_target', '<=', record.total_own_product_purchase),
-                    ('company_id', '=', record.company_id.id),
-                    ('fiscal_year_id', '=', record.fiscal_year_id.id),
-                    ('active', '=', True)
-                ], order='purchase_target desc')
-                if commission_rules:
-                    record.commission_rule_id = commission_rules[0]
-                else:
-                    record.commission_rule_id = False
+                rule = CommissionConfig._find_rule(
+                    record.company_id, record.fiscal_year_id, record.total_own_product_purchase)
             else:
-                record.commission_rule_id = False
+                rule = CommissionConfig
+            ids_by_rule[rule].append(record.id)
+        # one assignment per rule instead of one per commission
+        for rule, ids in ids_by_rule.items():
+            self.browse(ids).commission_rule_id = rule
 
     @api.depends('commission_rule_id', 'commission_amount', 'total_due', 'invoice_count', 'account_move_id.status_in_payment')
     def _compute_state(self):
         for record in self:
-            if not record.commission_rule_id or record.total_due > 0:
-                record.state = 'draft'
+            record.state = 'draft'
             if record.commission_rule_id and record.total_due > 0 and record.commission_amount > 0:
                 record.state = 'applicable'
             if record.commission_amount > 0 and record.total_due == 0 and record.invoice_count == 0:
@@ -120,92 +124,77 @@ class CustomerCommission(models.Model):
                     record.state = 'in_payment'
 
     def recompute_all(self):
-        for record in self:
-            record._compute_total_purchase()
-            record._compute_total_invoiced()
-            record._compute_total_paid()
-            record._compute_total_due()
-            record.action_update_commission_rules()
-            record._compute_commission_amount()
-
-    @api.depends('partner_id', 'fiscal_year_id')
-    def _compute_total_own_product_purchase(self):
-        for record in self:
-            if record.partner_id and record.fiscal_year_id:
-                start_date = record.fiscal_year_id.date_from
-                end_date = record.fiscal_year_id.date_to
-                sales_orders = self.env['sale.order'].search([
-                    ('partner_id', '=', record.partner_id.id),
-                    ('date_order', '>=', start_date),
-                    ('date_order', '<=', end_date),
-                    ('state', 'in', ['sale'])
-                ])
-                # product_template_category 'own_product' is used to identify own products
-                own_product_category = self.env['product.category'].search([('name', '=', 'Own Product')], limit=1)
-                if own_product_category:
-                    own_product_lines = sales_orders.mapped('order_line').filtered(
-                        lambda line: line.product_id.categ_id == own_product_category
-                    )
-                    record.total_own_product_purchase = sum(own_product_lines.mapped('price_total'))
-            else:
-                record.total_own_product_purchase = 0.0
+        fnames = ['ledger_id', *TOTAL_FIELDS, 'total_due']
+        for fname in fnames:
+            self.env.add_to_compute(self._fields[fname], self)
+        self._recompute_recordset(fnames)
+        self.action_update_commission_rules()
 
-    @api.depends('partner_id', 'fiscal_year_id')
-    def _compute_total_purchase(self):
-        for record in self:
-            if record.partner_id and record.fiscal_year_id:
-                start_date = record.fiscal_year_id.date_from
-                end_date = record.fiscal_year_id.date_to
-                sales_orders = self.env['sale.order'].search([
-                    ('partner_id', '=', record.partner_id.id),
-                    ('date_order', '>=', start_date),
-                    ('date_order', '<=', end_date),
-                    ('state', 'in', ['sale'])
-                ])
-                record.total_purchase = sum(sales_orders.mapped('amount_total'))
-            else:
-                record.total_purchase = 0.0
+    def _get_fiscal_year_totals(self):
+        """Aggregate purchases, invoices, payments and own product purchases of
+        all records at once. Every fiscal year costs one grouped query per source,
+        whatever the number of partners. Returns a dict keyed by
+        (partner_id, fiscal_year_id) holding the values of TOTAL_FIELDS."""
+        Ledger = self.env['customer.commission.ledger'].sudo()
+        totals = defaultdict(lambda: dict.fromkeys(TOTAL_FIELDS, 0.0))
+        for fiscal_year, records in self.grouped('fiscal_year_id').items():
+            partner_ids = records.partner_id.ids
+            if not fiscal_year or not partner_ids:
+                continue
+            for partner_id, values in Ledger._aggregate_totals(fiscal_year, partner_ids).items():
+                totals[(partner_id, fiscal_year.id)] = values
+        return totals
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records._enqueue_missing_ledgers()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        if {'partner_id', 'fiscal_year_id', 'company_id'}.intersection(vals):
+            self._enqueue_missing_ledgers()
+        return res
 
-    @api.depends('partner_id', 'fiscal_year_id')
-    def _compute_total_invoiced(self):
+    def _enqueue_missing_ledgers(self):
+        """Queue the commissions of self without a ledger row, the queue creates
+        the row from the documents and the ledger keeps their totals current."""
+        self.env['customer.commission.queue'].sudo()._enqueue({
+            (record.partner_id.id, record.fiscal_year_id.id, record.company_id.id)
+            for record in self if not record.ledger_id and record.partner_id and record.fiscal_year_id
+        })
+
+    @api.depends('partner_id', 'fiscal_year_id', 'company_id')
+    def _compute_ledger_id(self):
+        ledgers = self.env['customer.commission.ledger'].sudo().search([
+            ('partner_id', 'in', self.partner_id.ids),
+            ('fiscal_year_id', 'in', self.fiscal_year_id.ids)
+        ])
+        ledger_by_key = {(ledger.partner_id.id, ledger.fiscal_year_id.id, ledger.company_id.id): ledger
+                         for ledger in ledgers}
         for record in self:
-            if record.partner_id and record.fiscal_year_id:
-                start_date = record.fiscal_year_id.date_from
-                end_date = record.fiscal_year_id.date_to
-                invoices = self.env['account.move'].search([
-                    ('partner_id', '=', record.partner_id.id),
-                    ('move_type', 'in', ['out_invoice']),
-                    ('invoice_date', '>=', start_date),
-                    ('invoice_date', '<=', end_date),
-                    ('state', 'in', ['posted'])
-                ])
-                record.total_invoiced = sum(invoices.mapped('amount_total'))
-            else:
-                record.total_invoiced = 0.0
+            record.ledger_id = ledger_by_key.get(
+                (record.partner_id.id, record.fiscal_year_id.id, record.company_id.id), False)
 
-    @api.depends('partner_id', 'fiscal_year_id')
-    def _compute_total_paid(self):
+    @api.depends('partner_id', 'fiscal_year_id',
+                 'ledger_id.total_purchase', 'ledger_id.total_own_product_purchase',
+                 'ledger_id.total_invoiced', 'ledger_id.total_paid')
+    def _compute_totals(self):
+        """Read the totals from the commission ledger. Records without a ledger
+        entry yet are aggregated from the documents until the queue creates it,
+        see _enqueue_missing_ledgers."""
+        totals = self.filtered(lambda r: not r.ledger_id)._get_fiscal_year_totals()
         for record in self:
-            if record.partner_id and record.fiscal_year_id:
-                start_date = record.fiscal_year_id.date_from
-                end_date = record.fiscal_year_id.date_to
-                payments = self.env['account.payment'].search([
-                    ('partner_id', '=', record.partner_id.id),
-                    ('date', '>=', start_date),
-                    ('date', '<=', end_date),
-                    ('payment_type', '=', 'inbound'),
-                    ('state', 'in', ['paid'])
-                ])
-                record.total_paid = sum(payments.mapped('amount'))
+            if record.ledger_id:
+                record.update(record.ledger_id.sudo()._get_totals())
             else:
-                record.total_paid = 0.0
+                record.update(totals[(record.partner_id.id, record.fiscal_year_id.id)])
 
     @api.depends('total_invoiced', 'total_paid')
     def _compute_total_due(self):
         for record in self:
             record.total_due = record.total_invoiced - record.total_paid
-            if record.total_due == 0 and record.commission_amount > 0 and record.state != 'paid':
-                record.state = 'eligible'
 
     @api.constrains('fiscal_year_id', 'partner_id')
     def _check_duplicate_commissions(self):
@@ -219,18 +208,13 @@ class CustomerCommission(models.Model):
             if duplicate:
                 raise ValidationError(f"A commission record for customer {record.partner_id.name} in fiscal year {record.fiscal_year_id.name} already exists!")
 
-    def action_make_payment(self):
-        """Create a credit note for commission payment to customer"""
-        self.ensure_one()
-        # if todays date in not after fiscal year end date, raise error
-        if fields.Date.today() <= self.fiscal_year_id.date_to:
-            raise ValidationError("You can only make a payment after the fiscal year end date!")
-
+    @api.model
+    def _get_commission_product(self, company):
         # Check if commission product exists, create if not
         commission_product = self.env['product.product'].search([
             ('name', '=', 'Purchase Commission'),
             ('type', '=', 'service'),
-            ('company_id', 'in', [self.company_id.id, False])
+            ('company_id', 'in', [company.id, False])
         ], limit=1)
 
         if not commission_product:
@@ -240,16 +224,15 @@ class CustomerCommission(models.Model):
                 'invoice_policy': 'order',
                 'company_id': False,
             })
+        return commission_product
 
-        # Create credit note
-        invoice_vals = {
+    def _prepare_credit_note_vals(self, commission_product, journal):
+        self.ensure_one()
+        return {
             'move_type': 'out_refund',
             'partner_id': self.partner_id.id,
             'invoice_date': fields.Date.today(),
-            'journal_id': self.env['account.journal'].search([
-                ('type', '=', 'sale'),
-                ('company_id', '=', self.company_id.id)
-            ], limit=1).id,
+            'journal_id': journal.id,
             'commission_id': self.id,
             'invoice_line_ids': [(0, 0, {
                 'product_id': commission_product.id,
@@ -261,11 +244,33 @@ class CustomerCommission(models.Model):
             'ref': f"Commission for {self.partner_id.name} - {self.fiscal_year_id.name}"
         }
 
-        credit_note = self.env['account.move'].create(invoice_vals)
-        credit_note.action_post()
+    def _create_credit_notes(self):
+        """Create and post the commission credit notes, with one create() per company."""
+        credit_notes = self.env['account.move']
+        for company, records in self.grouped('company_id').items():
+            commission_product = self._get_commission_product(company)
+            journal = self.env['account.journal'].search([
+                ('type', '=', 'sale'),
+                ('company_id', '=', company.id)
+            ], limit=1)
+            company_credit_notes = self.env['account.move'].create([
+                record._prepare_credit_note_vals(commission_product, journal) for record in records
+            ])
+            company_credit_notes.action_post()
+            # create() keeps the order of the values
+            for record, credit_note in zip(records, company_credit_notes):
+                record.account_move_id = credit_note
+            credit_notes |= company_credit_notes
+        return credit_notes
 
-        # Update commission state
-        self.write({'account_move_id': credit_note.id, 'state': 'in_payment'})
+    def action_make_payment(self):
+        """Create a credit note for commission payment to customer"""
+        self.ensure_one()
+        # if todays date in not after fiscal year end date, raise error
+        if fields.Date.today() <= self.fiscal_year_id.date_to:
+            raise ValidationError("You can only make a payment after the fiscal year end date!")
+
+        credit_note = self._create_credit_notes()
 
         # Return action to view the created credit note
         return {
@@ -276,6 +281,83 @@ class CustomerCommission(models.Model):
             'res_id': credit_note.id,
         }
 
+    @api.model
+    def _close_fiscal_year(self, fiscal_year, chunk_size=200, auto_commit=False):
+        """Pay every eligible commission of a closed fiscal year with credit notes.
+
+        Commissions are processed by chunks locked with SKIP LOCKED, so several
+        workers can close the same fiscal year concurrently. With auto_commit each
+        chunk is committed. A failing chunk is retried commission by commission,
+        the failing ones are logged and skipped for the rest of the run so they
+        never block the following chunks. Returns whether every commission was paid.
+        """
+        if fields.Date.today() <= fiscal_year.date_to:
+            raise ValidationError("You can only make a payment after the fiscal year end date!")
+        failed_ids = []
+        while True:
+            self.env.flush_all()
+            self.env.cr.execute("""
+                SELECT id
+                  FROM customer_commission
+                 WHERE fiscal_year_id = %s
+                   AND state = 'eligible'
+                   AND account_move_id IS NULL
+                   AND id != ALL(%s)
+              ORDER BY id
+                 LIMIT %s
+                   FOR UPDATE SKIP LOCKED
+            """, (fiscal_year.id, failed_ids, chunk_size))
+            commission_ids = [row[0] for row in self.env.cr.fetchall()]
+            if not commission_ids:
+                break
+            try:
+                with self.env.cr.savepoint():
+                    self.browse(commission_ids)._create_credit_notes()
+            except Exception:
+                _logger.warning("Failed to close commissions %s of fiscal year %s, retrying them one by one",
+                                commission_ids, fiscal_year.name)
+                for commission in self.browse(commission_ids):
+                    try:
+                        with self.env.cr.savepoint():
+                            commission._create_credit_notes()
+                    except Exception:
+                        _logger.exception("Failed to close commission %s of fiscal year %s, skipped",
+                                          commission.id, fiscal_year.name)
+                        failed_ids.append(commission.id)
+            if auto_commit:
+                self.env.cr.commit()
+            _logger.info("Processed %s commissions of fiscal year %s", len(commission_ids), fiscal_year.name)
+        if failed_ids:
+            _logger.error("%s commissions of fiscal year %s could not be paid: %s",
+                          len(failed_ids), fiscal_year.name, failed_ids)
+        return not failed_ids
+
+    @api.model
+    def _cron_close_fiscal_years(self):
+        fiscal_years = self.env['account.fiscal.year'].search([('commission_close_requested', '=', True)])
+        for fiscal_year in fiscal_years:
+            if self._close_fiscal_year(fiscal_year, auto_commit=True):
+                fiscal_year.commission_close_requested = False
+                self.env.cr.commit()
+
+    def action_close_fiscal_year(self):
+        """Request the payment of all eligible commissions of the selected fiscal years."""
+        fiscal_years = self.fiscal_year_id.filtered(lambda fy: fy.date_to < fields.Date.today())
+        if not fiscal_years:
+            raise ValidationError("You can only make a payment after the fiscal year end date!")
+        fiscal_years.commission_close_requested = True
+        self.env.ref('purchase_commission.ir_cron_close_commission_fiscal_years')._trigger()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Year-End Close Scheduled',
+                'message': f"Eligible commissions of {', '.join(fiscal_years.mapped('name'))} will be paid in the background.",
+                'type': 'success',
+                'sticky': False,
+            }
+        }
+
     @api.depends('state', 'account_move_id.status_in_payment', 'account_move_id.matched_payment_ids')
     def _compute_payment_date(self):
         for record in self:
@@ -1,4 +1,6 @@
-from odoo import models, fields, api
+import bisect
+
+from odoo import models, fields, api, tools
 from odoo.exceptions import ValidationError
 from num2words import num2words
 from odoo.addons.purchase_commission.utils.number_utils import number_to_words_bangladesh
@@ -27,13 +29,42 @@ class CustomerDiscountConfig(models.Model):
 
     @api.model
     def _get_default_fiscal_year(self):
-        today = fields.Date.today()
-        fiscal_year = self.env['account.fiscal.year'].search([
-            ('date_from', '<=', today),
-            ('date_to', '>=', today)
-        ], limit=1)
+        fiscal_year = self.env['account.fiscal.year']._find_fiscal_year(self.env.company, fields.Date.today())
         return fiscal_year.id if fiscal_year else False
 
+    @api.model
+    @tools.ormcache('company_id', 'fiscal_year_id')
+    def _get_rule_table(self, company_id, fiscal_year_id):
+        """Purchase targets and ids of the active rules of a company and fiscal year,
+        sorted by ascending purchase target."""
+        rules = self.sudo().search([
+            ('company_id', '=', company_id),
+            ('fiscal_year_id', '=', fiscal_year_id),
+            ('active', '=', True)
+        ], order='purchase_target')
+        return tuple(rules.mapped('purchase_target')), tuple(rules.ids)
+
+    @api.model
+    def _find_rule(self, company, fiscal_year, amount):
+        """Rule with the highest purchase target reached by amount."""
+        targets, ids = self._get_rule_table(company.id, fiscal_year.id)
+        index = bisect.bisect_right(targets, amount) - 1
+        return self.browse(ids[index]) if index >= 0 else self.browse()
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.env.registry.clear_cache()
+        return super().create(vals_list)
+
+    def write(self, vals):
+        if {'purchase_target', 'active', 'company_id', 'fiscal_year_id'}.intersection(vals):
+            self.env.registry.clear_cache()
+        return super().write(vals)
+
+    def unlink(self):
+        self.env.registry.clear_cache()
+        return super().unlink()
+
     @staticmethod
     def number_to_words_bangladesh(number):
         """Convert number to Bangladeshi Bengali format words"""
@@ -0,0 +1,259 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+TOTAL_FIELDS = ('total_purchase', 'total_invoiced', 'total_paid', 'total_own_product_purchase')
+
+
+class CustomerCommissionLedger(models.Model):
+    _name = 'customer.commission.ledger'
+    _description = 'Customer Commission Ledger'
+    _order = 'fiscal_year_id desc, partner_id'
+
+    partner_id = fields.Many2one('res.partner', string='Customer', required=True, index=True, ondelete='cascade')
+    fiscal_year_id = fields.Many2one('account.fiscal.year', string='Fiscal Year', required=True, index=True,
+                                     ondelete='cascade')
+    company_id = fields.Many2one('res.company', string='Company', required=True, index=True, ondelete='cascade')
+    total_purchase = fields.Float(string='Total Purchases', readonly=True)
+    total_own_product_purchase = fields.Float(string='Total Own Product Purchases', readonly=True)
+    total_invoiced = fields.Float(string='Total Invoiced', readonly=True)
+    total_paid = fields.Float(string='Total Paid', readonly=True)
+
+    _sql_constraints = [
+        ('partner_fiscal_year_company_uniq', 'unique(partner_id, fiscal_year_id, company_id)',
+         'Only one ledger entry is allowed per customer, fiscal year and company!'),
+    ]
+
+    def _get_totals(self):
+        self.ensure_one()
+        return {fname: self[fname] for fname in TOTAL_FIELDS}
+
+    @api.model
+    def _get_fiscal_year(self, company, date):
+        return self.env['account.fiscal.year']._find_fiscal_year(company, date)
+
+    @api.model
+    def _add_entries(self, entries):
+        """Add the given amounts to the running totals.
+
+        :param entries: iterable of (partner, company, date, values) where values maps
+                        a field of TOTAL_FIELDS to the (signed) amount to add
+        """
+        deltas = defaultdict(lambda: defaultdict(float))
+        for partner, company, date, values in entries:
+            if not partner or not date:
+                continue
+            fiscal_year = self._get_fiscal_year(company, date)
+            if not fiscal_year:
+                continue
+            for fname, amount in values.items():
+                deltas[(partner.id, fiscal_year.id, company.id)][fname] += amount
+        self._apply_deltas(deltas)
+
+    @api.model
+    def _apply_deltas(self, deltas):
+        """Add the deltas keyed by (partner_id, fiscal_year_id, company_id) to the
+        ledger rows. Increments are done in SQL so that concurrent transactions
+        never overwrite each other's amounts. Keys without a row yet are seeded
+        from the documents instead, see _refresh, the hooks calling this method
+        run once the documents are updated so the aggregate includes the delta."""
+        ledger_ids, missing_keys = [], set()
+        for (partner_id, fiscal_year_id, company_id), values in deltas.items():
+            if not any(values.values()):
+                continue
+            self.env.cr.execute("""
+                UPDATE customer_commission_ledger
+                   SET total_purchase = total_purchase + %s,
+                       total_own_product_purchase = total_own_product_purchase + %s,
+                       total_invoiced = total_invoiced + %s,
+                       total_paid = total_paid + %s,
+                       write_uid = %s,
+                       write_date = now() at time zone 'UTC'
+                 WHERE partner_id = %s AND fiscal_year_id = %s AND company_id = %s
+             RETURNING id
+            """, (
+                values.get('total_purchase', 0.0), values.get('total_own_product_purchase', 0.0),
+                values.get('total_invoiced', 0.0), values.get('total_paid', 0.0),
+                self.env.uid, partner_id, fiscal_year_id, company_id,
+            ))
+            row = self.env.cr.fetchone()
+            if row:
+                ledger_ids.append(row[0])
+            else:
+                missing_keys.add((partner_id, fiscal_year_id, company_id))
+        if ledger_ids:
+            self.invalidate_model(list(TOTAL_FIELDS))
+            # the update bypasses the ORM, notify the stored totals of the commissions
+            self.browse(ledger_ids).modified(list(TOTAL_FIELDS))
+        self._refresh(missing_keys)
+
+    @api.model
+    def _refresh(self, keys):
+        """Set the ledger rows of the (partner_id, fiscal_year_id, company_id)
+        keys to the totals aggregated from the documents, creating the missing rows."""
+        partner_ids_by_fiscal_year = defaultdict(set)
+        for partner_id, fiscal_year_id, _company_id in keys:
+            if partner_id and fiscal_year_id:
+                partner_ids_by_fiscal_year[fiscal_year_id].add(partner_id)
+        for fiscal_year_id, partner_ids in partner_ids_by_fiscal_year.items():
+            self._refresh_fiscal_year(self.env['account.fiscal.year'].browse(fiscal_year_id), list(partner_ids))
+
+    @api.model
+    def _refresh_fiscal_year(self, fiscal_year, partner_ids=None):
+        """Set the ledger rows of the fiscal year, of the given partners or all of
+        them, to the totals aggregated from the documents. Rows are locked before
+        aggregating, a concurrent delta waits for the refreshed totals."""
+        cr = self.env.cr
+        company_id = fiscal_year.company_id.id
+        inserted = self._insert_rows(fiscal_year, partner_ids or [])
+        if partner_ids is None:
+            cr.execute("""
+                SELECT id, partner_id FROM customer_commission_ledger
+                 WHERE fiscal_year_id = %s AND company_id = %s
+                   FOR UPDATE
+            """, (fiscal_year.id, company_id))
+        else:
+            cr.execute("""
+                SELECT id, partner_id FROM customer_commission_ledger
+                 WHERE fiscal_year_id = %s AND company_id = %s AND partner_id = ANY(%s)
+                   FOR UPDATE
+            """, (fiscal_year.id, company_id, partner_ids))
+        ledger_ids = {partner_id: ledger_id for ledger_id, partner_id in cr.fetchall()}
+        totals = self._aggregate_totals(fiscal_year, partner_ids)
+        if partner_ids is None:
+            new_partner_ids = [partner_id for partner_id in totals if partner_id and partner_id not in ledger_ids]
+            new_rows = self._insert_rows(fiscal_year, new_partner_ids)
+            inserted.update(new_rows)
+            ledger_ids.update(new_rows)
+        if not ledger_ids:
+            return
+        columns = {fname: [] for fname in TOTAL_FIELDS}
+        for partner_id in ledger_ids:
+            # partners without documents left are reset
+            values = totals.get(partner_id) or dict.fromkeys(TOTAL_FIELDS, 0.0)
+            for fname in TOTAL_FIELDS:
+                columns[fname].append(values[fname])
+        cr.execute("""
+            UPDATE customer_commission_ledger AS ledger
+               SET total_purchase = data.total_purchase,
+                   total_own_product_purchase = data.total_own_product_purchase,
+                   total_invoiced = data.total_invoiced,
+                   total_paid = data.total_paid,
+                   write_uid = %s,
+                   write_date = now() at time zone 'UTC'
+              FROM unnest(%s::int[], %s::float8[], %s::float8[], %s::float8[], %s::float8[])
+                   AS data(id, total_purchase, total_own_product_purchase, total_invoiced, total_paid)
+             WHERE ledger.id = data.id
+        """, (
+            self.env.uid, list(ledger_ids.values()), columns['total_purchase'],
+            columns['total_own_product_purchase'], columns['total_invoiced'], columns['total_paid'],
+        ))
+        self.invalidate_model(list(TOTAL_FIELDS))
+        self.browse(list(ledger_ids.values())).modified(list(TOTAL_FIELDS))
+        if inserted:
+            # commissions created before their ledger row
+            Commission = self.env['customer.commission'].sudo()
+            commissions = Commission.search([
+                ('ledger_id', '=', False),
+                ('partner_id', 'in', list(inserted)),
+                ('fiscal_year_id', '=', fiscal_year.id)
+            ])
+            self.env.add_to_compute(Commission._fields['ledger_id'], commissions)
+
+    @api.model
+    def _insert_rows(self, fiscal_year, partner_ids):
+        """Insert empty ledger rows for the partners of the fiscal year, returns
+        the IDs of the inserted rows keyed by partner_id"""
+        if not partner_ids:
+            return {}
+        self.env.cr.execute("""
+            INSERT INTO customer_commission_ledger (
+                partner_id, fiscal_year_id, company_id,
+                total_purchase, total_own_product_purchase, total_invoiced, total_paid,
+                create_uid, create_date, write_uid, write_date
+            )
+            SELECT partner_id, %s, %s, 0, 0, 0, 0, %s, now() at time zone 'UTC', %s, now() at time zone 'UTC'
+              FROM unnest(%s::int[]) AS partner_id
+            ON CONFLICT (partner_id, fiscal_year_id, company_id) DO NOTHING
+            RETURNING partner_id, id
+        """, (fiscal_year.id, fiscal_year.company_id.id, self.env.uid, self.env.uid, list(partner_ids)))
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _aggregate_totals(self, fiscal_year, partner_ids=None):
+        """Aggregate purchases, invoices, payments and own product purchases of a
+        fiscal year from the documents themselves, with one grouped query per source.
+        Returns a dict keyed by partner_id holding the values of TOTAL_FIELDS."""
+        totals = defaultdict(lambda: dict.fromkeys(TOTAL_FIELDS, 0.0))
+        start_date = fiscal_year.date_from
+        end_date = fiscal_year.date_to
+        partner_domain = [('partner_id', 'in', partner_ids)] if partner_ids is not None else []
+        company_domain = [('company_id', '=', fiscal_year.company_id.id)]
+
+        sale_groups = self.env['sale.order']._read_group(partner_domain + company_domain + [
+            ('date_order', '>=', start_date),
+            ('date_order', '<', end_date + timedelta(days=1)),
+            ('state', 'in', ['sale'])
+        ], ['partner_id'], ['amount_total:sum'])
+        for partner, amount in sale_groups:
+            totals[partner.id]['total_purchase'] = amount
+
+        line_partner_domain = [('order_partner_id', 'in', partner_ids)] if partner_ids is not None else []
+        own_product_groups = self.env['sale.order.line']._read_group(line_partner_domain + company_domain + [
+            ('order_id.date_order', '>=', start_date),
+            ('order_id.date_order', '<', end_date + timedelta(days=1)),
+            ('order_id.state', 'in', ['sale']),
+            ('product_id.is_own_product', '=', True)
+        ], ['order_partner_id'], ['price_total:sum'])
+        for partner, amount in own_product_groups:
+            totals[partner.id]['total_own_product_purchase'] = amount
+
+        invoice_groups = self.env['account.move']._read_group(partner_domain + company_domain + [
+            ('move_type', 'in', ['out_invoice']),
+            ('invoice_date', '>=', start_date),
+            ('invoice_date', '<=', end_date),
+            ('state', 'in', ['posted'])
+        ], ['partner_id'], ['amount_total:sum'])
+        for partner, amount in invoice_groups:
+            totals[partner.id]['total_invoiced'] = amount
+
+        payment_groups = self.env['account.payment']._read_group(partner_domain + company_domain + [
+            ('date', '>=', start_date),
+            ('date', '<=', end_date),
+            ('payment_type', '=', 'inbound'),
+            ('state', 'in', ['paid'])
+        ], ['partner_id'], ['amount:sum'])
+        for partner, amount in payment_groups:
+            totals[partner.id]['total_paid'] = amount
+        return totals
+
+    @api.model
+    def _rebuild(self, fiscal_years):
+        """Recompute the ledger of the given fiscal years from scratch. Rows are
+        refilled in place so commissions keep their ledger."""
+        for fiscal_year in fiscal_years:
+            self._refresh_fiscal_year(fiscal_year)
+
+    @api.model
+    def _get_product_keys(self, product_ids):
+        """(partner_id, fiscal_year_id, company_id) keys of the confirmed orders of the products"""
+        if not product_ids:
+            return set()
+        self.env['sale.order.line'].flush_model(['order_id', 'product_id'])
+        self.env['sale.order'].flush_model(['partner_id', 'company_id', 'date_order', 'state'])
+        self.env.cr.execute("""
+            SELECT DISTINCT sale_order.partner_id, fiscal_year.id, sale_order.company_id
+              FROM sale_order_line
+              JOIN sale_order ON sale_order.id = sale_order_line.order_id
+              JOIN account_fiscal_year fiscal_year ON fiscal_year.company_id = sale_order.company_id
+                   AND sale_order.date_order::date BETWEEN fiscal_year.date_from AND fiscal_year.date_to
+             WHERE sale_order_line.product_id = ANY(%s) AND sale_order.state = 'sale'
+        """, (list(product_ids),))
+        return set(self.env.cr.fetchall())
+
+    def action_rebuild(self):
+        fiscal_years = self.fiscal_year_id or self.env['account.fiscal.year'].search([
+            ('company_id', 'in', self.env.companies.ids)
+        ])
+        self.sudo()._rebuild(fiscal_years)
@@ -0,0 +1,64 @@
+from odoo import models, fields, api
+
+QUEUE_PRECOMMIT_KEY = 'purchase_commission.commission_queue_keys'
+
+
+class CustomerCommissionQueue(models.Model):
+    _name = 'customer.commission.queue'
+    _description = 'Customer Commission Recompute Queue'
+    _order = 'id'
+
+    partner_id = fields.Many2one('res.partner', string='Customer', required=True, ondelete='cascade')
+    fiscal_year_id = fields.Many2one('account.fiscal.year', string='Fiscal Year', required=True, ondelete='cascade')
+    company_id = fields.Many2one('res.company', string='Company', required=True, ondelete='cascade')
+
+    @api.model
+    def _enqueue(self, keys):
+        """Mark (partner_id, fiscal_year_id, company_id) keys as dirty. Keys are
+        collapsed per transaction and stored once, right before commit."""
+        if not keys:
+            return
+        data = self.env.cr.precommit.data
+        if QUEUE_PRECOMMIT_KEY not in data:
+            data[QUEUE_PRECOMMIT_KEY] = set()
+            self.env.cr.precommit.add(self._flush_enqueued)
+        data[QUEUE_PRECOMMIT_KEY].update(keys)
+
+    @api.model
+    def _flush_enqueued(self):
+        keys = self.env.cr.precommit.data.pop(QUEUE_PRECOMMIT_KEY, set())
+        if not keys:
+            return
+        self.create([{
+            'partner_id': partner_id,
+            'fiscal_year_id': fiscal_year_id,
+            'company_id': company_id,
+        } for partner_id, fiscal_year_id, company_id in keys])
+        self.env.ref('purchase_commission.ir_cron_process_commission_queue')._trigger()
+
+    @api.model
+    def _process_queue(self, limit=1000):
+        """Refresh the ledger of every dirty key from the documents and recompute
+        its commission once, creating the missing ones."""
+        entries = self.search([], limit=limit)
+        if not entries:
+            return
+        keys = {(entry.partner_id.id, entry.fiscal_year_id.id, entry.company_id.id) for entry in entries}
+        # changes the hooks cannot turn into deltas, e.g. payments paid by a reconciliation
+        self.env['customer.commission.ledger'].sudo()._refresh(keys)
+        Commission = self.env['customer.commission']
+        commissions = Commission.search([
+            ('partner_id', 'in', entries.partner_id.ids),
+            ('fiscal_year_id', 'in', entries.fiscal_year_id.ids),
+            ('company_id', 'in', entries.company_id.ids)
+        ]).filtered(lambda c: (c.partner_id.id, c.fiscal_year_id.id, c.company_id.id) in keys)
+        existing_keys = {(c.partner_id.id, c.fiscal_year_id.id, c.company_id.id) for c in commissions}
+        commissions |= Commission.create([{
+            'partner_id': partner_id,
+            'fiscal_year_id': fiscal_year_id,
+            'company_id': company_id,
+        } for partner_id, fiscal_year_id, company_id in keys - existing_keys])
+        commissions.recompute_all()
+        entries.unlink()
+        if len(entries) == limit:
+            self.env.ref('purchase_commission.ir_cron_process_commission_queue')._trigger()
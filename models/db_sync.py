@@ -1,6 +1,21 @@
+import json
+import logging
+
 from odoo import models, fields, api
 
-import xmlrpc.client
+from odoo.addons.purchase_commission.utils.circuit_breaker import (
+    CLOSED, CONNECTION_ERRORS, GuardedServerProxy, get_circuit_breaker,
+)
+from odoo.addons.purchase_commission.utils.price_transform import PriceTransform
+from odoo.addons.purchase_commission.utils.remote_cache import remote_lookup_cache
+from odoo.addons.purchase_commission.utils.rpc_transport import DEFAULT_TIMEOUT, get_server_proxy
+from odoo.addons.purchase_commission.utils.sync_metrics import sync_metrics
+from odoo.addons.purchase_commission.utils.sync_plan import PlanningServerProxy, SyncPlan
+_logger = logging.getLogger(__name__)
+
+
+class _DryRunRollback(Exception):
+    """Rolls back the savepoint of a dry run"""
 
 
 class DBSyncMixin(models.AbstractModel):
@@ -13,10 +28,454 @@ class DBSyncMixin(models.AbstractModel):
             'url': ICP.get_param('purchase_commission.external_server_url', ''),
             'db': ICP.get_param('purchase_commission.external_server_db', ''),
             'uid': int(ICP.get_param('purchase_commission.external_server_uid', 0)),
-            'password': ICP.get_param('purchase_commission.external_server_password', '')
+            'password': ICP.get_param('purchase_commission.external_server_password', ''),
+            'user_name': ICP.get_param('purchase_commission.external_server_user_name', '')
         }
 
     def _db_sync_enabled(self):
+        # changes applied by the sync itself must not be sent back
+        if self.env.context.get('db_sync_skip'):
+            return False
+        # a dry run plans the sync whether it is enabled or not
+        if self.env.context.get('db_sync_plan'):
+            return True
         # if data_sync is true return true else false
         ICP = self.env['ir.config_parameter'].sudo()
-        return ICP.get_param('purchase_commission.data_sync', 'False') == 'True'
\ No newline at end of file
+        return ICP.get_param('purchase_commission.data_sync', 'False') == 'True'
+
+    def _sync_price_transform(self):
+        """Price decrease of the mirrored prices, read once per batch. Prices
+        are only decreased when the sale sync is enabled."""
+        ICP = self.env['ir.config_parameter'].sudo()
+        if ICP.get_param('purchase_commission.sale_sync', 'False') != 'True':
+            return PriceTransform()
+        percentages = []
+        for param in ('purchase_commission.sale_decreased_percentage', 'purchase_commission.trxn_decrease_percentage'):
+            try:
+                percentages.append(float(ICP.get_param(param, 0.0)))
+            except ValueError:
+                percentages.append(0.0)
+        return PriceTransform(*percentages)
+
+    def _sync_transform_prices(self, vals_list, transform):
+        """Apply the price transform to remote values of records of this model, in place"""
+        return vals_list
+
+    def _get_sync_timeout(self):
+        ICP = self.env['ir.config_parameter'].sudo()
+        try:
+            return int(ICP.get_param('purchase_commission.external_server_timeout', DEFAULT_TIMEOUT)) or DEFAULT_TIMEOUT
+        except ValueError:
+            return DEFAULT_TIMEOUT
+
+    def _get_remote_models(self, endpoint='object'):
+        """Pooled keep-alive XML-RPC proxy of the external server, the calls to
+        the object endpoint go through the circuit breaker of the server"""
+        config = self._get_external_config()
+        proxy = get_server_proxy(config['url'], endpoint, self._get_sync_timeout())
+        self._sync_flush_metrics()
+        if endpoint != 'object':
+            return proxy
+        proxy = GuardedServerProxy(proxy, self._get_circuit_breaker())
+        if self.env.context.get('db_sync_plan'):
+            return PlanningServerProxy(proxy, self.env.context['db_sync_plan'])
+        return proxy
+
+    def _sync_flush_metrics(self, force=False):
+        """Move the call metrics recorded by this worker to db.sync.metric, in
+        their own transaction, at most once per FLUSH_INTERVAL unless forced"""
+        if not (force or sync_metrics.flush_due()):
+            return
+        stats = sync_metrics.pop()
+        if not stats:
+            return
+        try:
+            with self.env.registry.cursor() as cr:
+                self.env(cr=cr, su=True)['db.sync.metric']._add_stats(stats)
+        except Exception as e:
+            # e.g. a concurrent flush of another worker, retried with the next one
+            _logger.debug("Sync metrics not flushed: %s", e)
+            sync_metrics.merge(stats)
+
+    def _get_circuit_breaker(self):
+        config = self._get_external_config()
+        return get_circuit_breaker((config['url'], config['db']))
+
+    def _sync_available(self):
+        """Whether the external server is expected to answer. While the circuit
+        breaker is open the sync runs in queue-only mode: records are saved
+        locally and sent by the outbox once the server recovers."""
+        if self.env.context.get('db_sync_plan'):
+            return True
+        return self._get_circuit_breaker().is_available()
+
+    def _sync_dry_run(self, func):
+        """Call func(records), records being self in dry-run mode: the sync runs
+        its translation logic and reads the remote database, but the remote
+        writes are only recorded in the returned SyncPlan. Local changes,
+        remote IDs and outbox entries included, are rolled back."""
+        plan = SyncPlan()
+        records = self.with_context(db_sync_plan=plan)
+        self.env.flush_all()
+        try:
+            with self.env.cr.savepoint():
+                func(records)
+                self.env.flush_all()
+                raise _DryRunRollback()
+        except _DryRunRollback:
+            pass
+        finally:
+            self.env.invalidate_all(flush=False)
+        return plan
+
+    def _sync_probe(self):
+        """Check an open circuit with a cheap call once its delay elapsed, from
+        the sync crons. Returns whether the external server can be called."""
+        breaker = self._get_circuit_breaker()
+        if breaker.state == CLOSED:
+            return True
+        if not breaker.is_available():
+            return False
+        try:
+            breaker.call(self._get_remote_models('common').version)
+        except Exception as e:
+            _logger.info("External server still unavailable: %s", e)
+            return False
+        _logger.info("External server available again, leaving queue-only mode")
+        return True
+
+    def _remote_lookup(self, model_name, domain, remote_models=None):
+        """ID of the first remote record of model_name matching domain, or False.
+        Found IDs are kept in the worker wide lookup cache, use it for reference
+        data (currencies, companies, packagings...) only."""
+        config = self._get_external_config()
+        key = (model_name, config['url'], config['db'], json.dumps(domain, default=str))
+        remote_id = remote_lookup_cache.get(key)
+        if remote_id is None:
+            remote_models = remote_models or self._get_remote_models()
+            remote_ids = remote_models.execute_kw(config['db'], config['uid'], config['password'],
+                                                  model_name, 'search', [domain], {'limit': 1})
+            remote_id = remote_ids[0] if remote_ids else False
+            # misses are not cached, the record may be created remotely any time
+            if remote_id:
+                remote_lookup_cache.set(key, remote_id)
+        return remote_id
+
+    def _remote_lookup_invalidate(self, model_name=None):
+        remote_lookup_cache.invalidate(model_name)
+
+    def _sync_ref(self, field_name):
+        """Remote ID of the record, or a reference the outbox resolves once the record is synced"""
+        self.ensure_one()
+        return self[field_name] or {'__ref__': [self._name, self.id, field_name]}
+
+    def _sync_is_linked(self, field_name):
+        """Whether the record has a remote ID or a pending remote create"""
+        self.ensure_one()
+        return bool(self[field_name]) or bool(self.env['db.sync.outbox'].sudo().search_count([
+            ('res_model', '=', self._name),
+            ('res_id', '=', self.id),
+            ('method', '=', 'create'),
+            ('state', '=', 'pending'),
+        ], limit=1))
+
+    def _sync_enqueue(self, model_name, method, args=(), kwargs=None, domain=None, remote_id_field=False):
+        """Queue a remote call in the sync outbox, self is the local record it is about (if any)"""
+        return self.env['db.sync.outbox'].sudo()._enqueue(
+            model_name, method, args, kwargs, domain,
+            record=self if len(self) == 1 else None, remote_id_field=remote_id_field)
+
+    def _sync_enqueue_resync(self):
+        """Queue-only mode: queue the records of self, they are sent with their
+        values at the time the outbox processes them, see _sync_push"""
+        pending = set(self.env['db.sync.outbox'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_id', 'in', self.ids),
+            ('method', '=', 'resync'),
+            ('state', '=', 'pending'),
+        ]).mapped('res_id'))
+        for record in self:
+            if record.id not in pending:
+                record._sync_enqueue(self._name, 'resync')
+
+    def _sync_map(self, remote_ids):
+        """Record the remote IDs of the records of self, given in the same order, in the mapping table"""
+        self.env['db.sync.mapping'].sudo()._map(self._name, zip(self.ids, remote_ids))
+
+    def _sync_get_remote_ids(self):
+        """Remote IDs of the records of self keyed by local ID, unmapped records are left out"""
+        return self.env['db.sync.mapping'].sudo()._get_remote_ids(self._name, self.ids)
+
+    # Sync engine: a model declaring the fields it synchronizes in _sync_fields
+    # is created, written and deleted remotely without overriding the ORM
+    # methods. Many2one fields are translated to the remote ID of their comodel,
+    # or by the method named in _sync_translators for comodels that are not
+    # synchronized (currencies, companies...) and for x2many fields. Remote
+    # records are matched by _sync_key_fields, see _sync_reconcile, and only the
+    # records matching _sync_reconcile_domain are created remotely.
+    _sync_fields = ()
+    _sync_translators = {}
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        if self._sync_fields and self._db_sync_enabled():
+            records._sync_engine_create()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        if self._sync_fields and self._db_sync_enabled():
+            self._sync_engine_write(vals)
+        return res
+
+    def unlink(self):
+        if self._sync_fields and self._db_sync_enabled():
+            self._sync_engine_unlink()
+        self.env['db.sync.mapping'].sudo()._unmap(self._name, self.ids)
+        return super().unlink()
+
+    def _sync_translate_vals(self, vals, remote_models):
+        """Translate values of _sync_fields to the remote database. Many2one
+        values may be given as IDs or records, unlinked references become False.
+        Translators are given the written value, x2many commands, or the field
+        value of the records; they return None to leave the field out."""
+        remote_vals = {}
+        for fname, value in vals.items():
+            field = self._fields[fname]
+            if fname in self._sync_translators:
+                value = getattr(self, self._sync_translators[fname])(value, remote_models)
+                if value is None:
+                    continue
+            elif field.type in ('one2many', 'many2many'):
+                _logger.warning("No translator for %s.%s, the field is not synchronized", self._name, fname)
+                continue
+            elif field.type in ('date', 'datetime'):
+                value = field.to_string(value) if value and not isinstance(value, str) else value or False
+            elif field.type == 'many2one':
+                comodel = self.env[field.comodel_name]
+                record = value if isinstance(value, models.BaseModel) else comodel.browse(value or [])
+                remote_id_field = getattr(comodel, '_sync_remote_id_field', None)
+                if remote_id_field:
+                    value = (record[remote_id_field] or False) if record else False
+                else:
+                    _logger.warning("No translator for %s.%s, the field is not synchronized", self._name, fname)
+                    continue
+            remote_vals[fname] = value
+        return remote_vals
+
+    def _sync_on_error(self, records, error):
+        """Error policy of the sync engine: records that could not be sent are
+        queued, the outbox retries them with backoff and reports the failures"""
+        if isinstance(error, CONNECTION_ERRORS):
+            _logger.warning("External server unavailable, %s %s queued for synchronization: %s",
+                            len(records), self._name, error)
+        else:
+            _logger.error("Failed to synchronize %s %s, queued for a retry: %s", self._name, records.ids, error)
+        records._sync_enqueue_resync()
+
+    def _sync_engine_create(self):
+        records = self.filtered_domain(self._sync_reconcile_domain())
+        if not records:
+            return
+        if not records._sync_available():
+            records._sync_enqueue_resync()
+            return
+        try:
+            records._sync_reconcile(records._get_remote_models())
+        except Exception as e:
+            records._sync_on_error(records.filtered(lambda record: not record[self._sync_remote_id_field]), e)
+
+    def _sync_engine_write(self, vals):
+        """Send the written values of _sync_fields to the linked records of self,
+        with a single write since the values are the same for all of them"""
+        fnames = [fname for fname in vals if fname in self._sync_fields]
+        linked = self.filtered(self._sync_remote_id_field)
+        if not fnames or not linked:
+            return
+        if not self._sync_available():
+            linked._sync_enqueue_resync()
+            return
+        config = self._get_external_config()
+        try:
+            remote_models = self._get_remote_models()
+            remote_vals = linked._sync_translate_vals({fname: vals[fname] for fname in fnames}, remote_models)
+            self._sync_transform_prices([remote_vals], self._sync_price_transform())
+            if remote_vals:
+                remote_models.execute_kw(config['db'], config['uid'], config['password'], self._name, 'write',
+                                         [linked.mapped(self._sync_remote_id_field), remote_vals])
+            linked._sync_written(vals, remote_models)
+        except Exception as e:
+            self._sync_on_error(linked, e)
+
+    def _sync_written(self, vals, remote_models):
+        """Called after the written values were sent to the remote records of self"""
+
+    def _sync_engine_unlink(self):
+        self.env['db.sync.outbox'].sudo()._cancel_pending(self)
+        for record in self.filtered(self._sync_remote_id_field):
+            # the remote record may be gone already, the domain makes the deletion a no-op then
+            record._sync_enqueue(self._name, 'unlink', domain=[['id', '=', record[self._sync_remote_id_field]]])
+
+    # Reconciliation, see db.sync.reconciliation. Synchronized models declare the
+    # field storing the remote ID and the fields identifying a record on both sides.
+    _sync_remote_id_field = None
+    _sync_key_fields = ('name',)
+
+    def _sync_reconcile_domain(self):
+        """Local records the reconciliation links or creates remotely"""
+        return []
+
+    def _sync_get_key(self):
+        self.ensure_one()
+        return tuple(self[fname] or False for fname in self._sync_key_fields)
+
+    def _sync_prepare_reconcile_vals(self, remote_models):
+        """Values to create the record remotely when no remote record matches its key"""
+        self.ensure_one()
+        if self._sync_fields:
+            return self._sync_translate_vals({fname: self[fname] for fname in self._sync_fields}, remote_models)
+        return {fname: self[fname] for fname in self._sync_key_fields}
+
+    def _sync_reconcile_waves(self):
+        """Split the records to create remotely in groups created one after the
+        other, for records referencing each other (parents first)"""
+        return [self]
+
+    def _sync_link(self, remote_ids, remote_models=None):
+        """Store the remote IDs of the records of self, given in the same order,
+        locally and in the mapping table, and write the backlinks remotely."""
+        if remote_models and self:
+            self._sync_write_backlinks(remote_ids, remote_models)
+        for record, remote_id in zip(self, remote_ids):
+            record.with_context(db_sync_skip=True).write({self._sync_remote_id_field: remote_id})
+        self._sync_map(remote_ids)
+
+    def _sync_write_backlinks(self, remote_ids, remote_models):
+        """Write the IDs of the records of self on their remote records, given
+        in the same order. A write sets the same values on all its records, the
+        backlinks are imported with a single load on database IDs instead."""
+        config = self._get_external_config()
+        result = remote_models.execute_kw(
+            config['db'], config['uid'], config['password'], self._name, 'load',
+            [['.id', self._sync_remote_id_field],
+             [[str(remote_id), str(record.id)] for record, remote_id in zip(self, remote_ids)]])
+        errors = [message['message'] for message in result.get('messages', []) if message.get('type') == 'error']
+        if errors or not result.get('ids'):
+            raise ValueError(f"Failed to write the {self._name} backlinks remotely: {'; '.join(errors)}")
+
+    def _sync_reconcile(self, remote_models):
+        """Link the records of self, not linked yet, to the remote records with
+        the same key, and create the missing ones with list-form creates.
+        Returns the number of linked and created records."""
+        config = self._get_external_config()
+        fnames = list(self._sync_key_fields)
+        backlink = self._sync_remote_id_field
+        keys = {record.id: record._sync_get_key() for record in self}
+        domain = [[fname, 'in', list({key[index] for key in keys.values() if key[index] is not False})]
+                  for index, fname in enumerate(fnames)]
+        remote_records = remote_models.execute_kw(
+            config['db'], config['uid'], config['password'], self._name, 'search_read',
+            [domain], {'fields': fnames + [backlink]}) if self else []
+        by_key = {}
+        for row in remote_records:
+            # remote records already linked to another local record are left alone
+            if row.get(backlink) and row[backlink] not in keys:
+                continue
+            row_key = tuple(row[fname][0] if isinstance(row[fname], list) else row[fname] for fname in fnames)
+            by_key.setdefault(row_key, row['id'])
+
+        to_link, link_ids = self.browse(), []
+        for record in self:
+            remote_id = by_key.pop(keys[record.id], None)
+            if remote_id:
+                to_link |= record
+                link_ids.append(remote_id)
+        to_link._sync_link(link_ids, remote_models)
+
+        to_create = self - to_link
+        transform = self._sync_price_transform()
+        for wave in to_create._sync_reconcile_waves():
+            if not wave:
+                continue
+            vals_list = []
+            for record in wave:
+                vals = record._sync_prepare_reconcile_vals(remote_models)
+                vals[backlink] = record.id
+                vals_list.append(vals)
+            self._sync_transform_prices(vals_list, transform)
+            created_ids = remote_models.execute_kw(config['db'], config['uid'], config['password'],
+                                                   self._name, 'create', [vals_list])
+            wave._sync_link(created_ids)
+        return len(to_link), len(to_create)
+
+    def _sync_prepare_push_vals(self, remote_models):
+        """Values written on the remote record of a linked record by _sync_push,
+        x2many commands would duplicate the remote lines"""
+        vals = self._sync_prepare_reconcile_vals(remote_models)
+        return {fname: value for fname, value in vals.items()
+                if self._fields[fname].type not in ('one2many', 'many2many')}
+
+    def _sync_push(self, remote_models):
+        """Send the current values of the records of self: the remote records
+        of linked records are written, with one call per distinct values, the
+        others are linked or created like in a reconciliation."""
+        config = self._get_external_config()
+        linked = self.filtered(self._sync_remote_id_field)
+        vals_list = self._sync_transform_prices(
+            [record._sync_prepare_push_vals(remote_models) for record in linked], self._sync_price_transform())
+        # records sharing the same values are written with a single call, e.g. after a mass update
+        writes = {}
+        for record, vals in zip(linked, vals_list):
+            key = json.dumps(vals, sort_keys=True, default=str)
+            writes.setdefault(key, (vals, []))[1].append(record[self._sync_remote_id_field])
+        for vals, remote_ids in writes.values():
+            remote_models.execute_kw(config['db'], config['uid'], config['password'], self._name, 'write',
+                                     [remote_ids, vals])
+        if self - linked:
+            (self - linked)._sync_reconcile(remote_models)
+
+    # Pull, see db.sync.pull: fields copied from the remote records when they change remotely
+    _sync_pull_fields = ()
+
+    @api.model
+    def _sync_apply_remote_rows(self, rows):
+        """Write the values of changed remote rows (search_read results) on the
+        linked local records, without sending them back to the remote database.
+        Remote records not linked to a local record are ignored. Returns the
+        number of updated records."""
+        Mapping = self.env['db.sync.mapping'].sudo()
+        local_ids = Mapping._get_local_ids(self._name, [row['id'] for row in rows])
+        # records linked before the mapping table existed are found by the remote backlink
+        backlinks = self.browse([row[self._sync_remote_id_field] for row in rows
+                                 if row['id'] not in local_ids and row.get(self._sync_remote_id_field)]).exists()
+        local_ids.update({record[self._sync_remote_id_field]: record.id for record in backlinks
+                          if record[self._sync_remote_id_field]})
+        # many2one values are translated with the mapping of their comodel
+        relational = {fname: self._fields[fname].comodel_name for fname in self._sync_pull_fields
+                      if self._fields[fname].type == 'many2one'}
+        references = {fname: Mapping._get_local_ids(comodel, [row[fname][0] for row in rows if row[fname]])
+                      for fname, comodel in relational.items()}
+        records = self.browse(list(local_ids.values())).exists()
+        updated = 0
+        for row in rows:
+            record = records.browse(local_ids.get(row['id']))
+            if not record or record not in records:
+                continue
+            vals = {}
+            for fname in self._sync_pull_fields:
+                value = row[fname]
+                if fname in relational:
+                    value = references[fname].get(value[0]) if value else False
+                    if value is None:
+                        # the referenced record is not linked locally
+                        continue
+                    current = record[fname].id
+                else:
+                    current = record[fname]
+                if (value or False) != (current or False):
+                    vals[fname] = value
+            if vals:
+                record.with_context(db_sync_skip=True).write(vals)
+                updated += 1
+        return updated
@@ -0,0 +1,87 @@
+from odoo import models, fields, api
+
+# remote ID fields the mapping table is initialised from, per local model
+REMOTE_ID_FIELDS = {
+    'res.partner': 'related_partner_id',
+    'product.template': 'related_product_id',
+    'product.product': 'remote_product_id',
+    'product.category': 'remote_category_id',
+    'product.attribute': 'remote_attribute_id',
+    'product.supplierinfo': 'remote_supplierinfo_id',
+    'account.account': 'remote_account_id',
+    'product.pricelist': 'remote_pricelist_id',
+    'product.pricelist.item': 'remote_pricelist_item_id',
+    'sale.order': 'remote_sale_order_id',
+    'sale.order.line': 'remote_sale_order_line_id',
+}
+
+
+class DBSyncMapping(models.Model):
+    _name = 'db.sync.mapping'
+    _description = 'Database Synchronization Mapping'
+    _order = 'model, local_id'
+    _log_access = False
+
+    model = fields.Char(string='Model', required=True, readonly=True)
+    local_id = fields.Integer(string='Local ID', required=True, readonly=True)
+    remote_id = fields.Integer(string='Remote ID', required=True, readonly=True)
+
+    _sql_constraints = [
+        ('model_local_id_uniq', 'unique(model, local_id)', 'A local record can only be mapped once!'),
+        ('model_remote_id_uniq', 'unique(model, remote_id)', 'A remote record can only be mapped once!'),
+    ]
+
+    def init(self):
+        # fill the table from the remote ID fields of the synchronized models
+        for model_name, field_name in REMOTE_ID_FIELDS.items():
+            Model = self.env[model_name]
+            self.env.cr.execute(f"""
+                INSERT INTO db_sync_mapping (model, local_id, remote_id)
+                SELECT %s, id, "{field_name}" FROM "{Model._table}" WHERE "{field_name}" IS NOT NULL AND "{field_name}" != 0
+                ON CONFLICT DO NOTHING
+            """, (model_name,))
+
+    @api.model
+    def _get_remote_ids(self, model_name, local_ids):
+        """Return a dict mapping the given local IDs to their remote ID, unmapped IDs are left out"""
+        if not local_ids:
+            return {}
+        self.env.cr.execute("""
+            SELECT local_id, remote_id FROM db_sync_mapping WHERE model = %s AND local_id = ANY(%s)
+        """, (model_name, list(local_ids)))
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _get_local_ids(self, model_name, remote_ids):
+        """Return a dict mapping the given remote IDs to their local ID, unmapped IDs are left out"""
+        if not remote_ids:
+            return {}
+        self.env.cr.execute("""
+            SELECT remote_id, local_id FROM db_sync_mapping WHERE model = %s AND remote_id = ANY(%s)
+        """, (model_name, list(remote_ids)))
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _map(self, model_name, pairs):
+        """Record the (local_id, remote_id) pairs of a model, replacing the
+        previous mappings of these local and remote IDs."""
+        pairs = {local_id: remote_id for local_id, remote_id in pairs if local_id and remote_id}
+        if not pairs:
+            return
+        self.env.cr.execute("""
+            DELETE FROM db_sync_mapping
+             WHERE model = %s AND (local_id = ANY(%s) OR remote_id = ANY(%s))
+        """, (model_name, list(pairs), list(pairs.values())))
+        self.env.cr.execute("""
+            INSERT INTO db_sync_mapping (model, local_id, remote_id)
+            SELECT %s, local_id, remote_id FROM unnest(%s::int[], %s::int[]) AS pair(local_id, remote_id)
+            ON CONFLICT DO NOTHING
+        """, (model_name, list(pairs), list(pairs.values())))
+        self.invalidate_model()
+
+    @api.model
+    def _unmap(self, model_name, local_ids):
+        self.env.cr.execute("""
+            DELETE FROM db_sync_mapping WHERE model = %s AND local_id = ANY(%s)
+        """, (model_name, list(local_ids)))
+        self.invalidate_model()
@@ -0,0 +1,171 @@
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+from odoo.addons.purchase_commission.utils.sync_metrics import COUNTERS, LATENCY_BUCKETS, histogram_percentile
+
+# columns of the latency histogram buckets, in the order of LATENCY_BUCKETS
+BUCKET_FIELDS = [
+    'bucket_50ms', 'bucket_100ms', 'bucket_250ms', 'bucket_500ms', 'bucket_1s',
+    'bucket_2_5s', 'bucket_5s', 'bucket_10s', 'bucket_30s', 'bucket_inf',
+]
+METRICS_PREFIX = 'purchase_commission_sync'
+
+
+class DBSyncMetric(models.Model):
+    _name = 'db.sync.metric'
+    _description = 'Database Synchronization Metric'
+    _order = 'model, method'
+    _log_access = False
+
+    model = fields.Char(string='Remote Model', required=True, readonly=True)
+    method = fields.Char(string='Method', required=True, readonly=True)
+    calls = fields.Integer(string='Calls', readonly=True)
+    error_count = fields.Integer(string='Errors', readonly=True)
+    rejected_count = fields.Integer(string='Rejected', readonly=True,
+                                    help="Calls not sent because the circuit breaker was open")
+    request_bytes = fields.Integer(string='Bytes Sent', readonly=True)
+    response_bytes = fields.Integer(string='Bytes Received', readonly=True)
+    latency_total = fields.Float(string='Total Latency (s)', readonly=True)
+    bucket_50ms = fields.Integer(readonly=True)
+    bucket_100ms = fields.Integer(readonly=True)
+    bucket_250ms = fields.Integer(readonly=True)
+    bucket_500ms = fields.Integer(readonly=True)
+    bucket_1s = fields.Integer(readonly=True)
+    bucket_2_5s = fields.Integer(readonly=True)
+    bucket_5s = fields.Integer(readonly=True)
+    bucket_10s = fields.Integer(readonly=True)
+    bucket_30s = fields.Integer(readonly=True)
+    bucket_inf = fields.Integer(readonly=True)
+    last_call_date = fields.Datetime(string='Last Call', readonly=True)
+    latency_avg = fields.Float(string='Average (ms)', compute='_compute_latency')
+    latency_p50 = fields.Float(string='p50 (ms)', compute='_compute_latency')
+    latency_p95 = fields.Float(string='p95 (ms)', compute='_compute_latency')
+    latency_p99 = fields.Float(string='p99 (ms)', compute='_compute_latency')
+    queue_depth = fields.Integer(string='Queued', compute='_compute_queue',
+                                 help="Pending outbox entries of this model and method")
+    queue_failed = fields.Integer(string='Failed', compute='_compute_queue',
+                                  help="Outbox entries of this model and method that gave up")
+    queue_lag = fields.Float(string='Queue Lag (s)', compute='_compute_queue',
+                             help="Age of the oldest pending outbox entry of this model and method")
+
+    _sql_constraints = [
+        ('model_method_uniq', 'unique(model, method)', 'Metrics are recorded once per model and method!'),
+    ]
+
+    def _get_buckets(self):
+        self.ensure_one()
+        return [self[fname] for fname in BUCKET_FIELDS]
+
+    @api.depends('calls', 'latency_total', *BUCKET_FIELDS)
+    def _compute_latency(self):
+        for metric in self:
+            buckets = metric._get_buckets()
+            metric.latency_avg = metric.latency_total / metric.calls * 1000 if metric.calls else 0.0
+            metric.latency_p50 = histogram_percentile(buckets, 0.5) * 1000
+            metric.latency_p95 = histogram_percentile(buckets, 0.95) * 1000
+            metric.latency_p99 = histogram_percentile(buckets, 0.99) * 1000
+
+    @api.model
+    def _get_queue_stats(self):
+        """Outbox depth per (model, method): dict of (pending, failed, oldest pending date)"""
+        stats = {}
+        for model_name, method, state, count, oldest in self.env['db.sync.outbox'].sudo()._read_group(
+                [('state', 'in', ['pending', 'failed'])], ['model_name', 'method', 'state'],
+                ['__count', 'create_date:min']):
+            pending, failed, oldest_pending = stats.get((model_name, method), (0, 0, False))
+            if state == 'pending':
+                stats[(model_name, method)] = (count, failed, oldest)
+            else:
+                stats[(model_name, method)] = (pending, count, oldest_pending)
+        return stats
+
+    def _compute_queue(self):
+        stats = self._get_queue_stats()
+        now = fields.Datetime.now()
+        for metric in self:
+            pending, failed, oldest = stats.get((metric.model, metric.method), (0, 0, False))
+            metric.queue_depth = pending
+            metric.queue_failed = failed
+            metric.queue_lag = (now - oldest).total_seconds() if oldest else 0.0
+
+    @api.model
+    def _add_stats(self, stats):
+        """Add the stats recorded by a worker, see SyncMetrics.pop()"""
+        columns = list(COUNTERS) + BUCKET_FIELDS
+        for (model_name, method), values in stats.items():
+            self.env.cr.execute(f"""
+                INSERT INTO db_sync_metric (model, method, last_call_date, {', '.join(columns)})
+                VALUES (%s, %s, now() at time zone 'UTC', {', '.join(['%s'] * len(columns))})
+                ON CONFLICT (model, method) DO UPDATE SET
+                    last_call_date = EXCLUDED.last_call_date,
+                    {', '.join(f'{column} = db_sync_metric.{column} + EXCLUDED.{column}' for column in columns)}
+            """, [model_name, method] + [values[counter] for counter in COUNTERS] + values['buckets'])
+        self.invalidate_model()
+
+    @api.model
+    def _get_metrics_text(self):
+        """Metrics in the Prometheus text exposition format"""
+        self.env['db.sync.mixin']._sync_flush_metrics(force=True)
+        metrics = self.sudo().search([])
+        lines = []
+
+        def add(name, kind, help_text, samples):
+            lines.append(f'# HELP {METRICS_PREFIX}_{name} {help_text}')
+            lines.append(f'# TYPE {METRICS_PREFIX}_{name} {kind}')
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{val}"' for key, val in labels.items())
+                lines.append(f'{METRICS_PREFIX}_{name}{{{label_text}}} {value}')
+
+        def labels(metric, **extra):
+            return dict(model=metric.model, method=metric.method, **extra)
+
+        add('calls_total', 'counter', "Calls sent to the external server",
+            [(labels(metric), metric.calls) for metric in metrics])
+        add('errors_total', 'counter', "Calls that raised an error",
+            [(labels(metric), metric.error_count) for metric in metrics])
+        add('rejected_total', 'counter', "Calls refused by the open circuit breaker",
+            [(labels(metric), metric.rejected_count) for metric in metrics])
+        add('request_bytes_total', 'counter', "Bytes sent to the external server",
+            [(labels(metric), metric.request_bytes) for metric in metrics])
+        add('response_bytes_total', 'counter', "Bytes received from the external server",
+            [(labels(metric), metric.response_bytes) for metric in metrics])
+        latency_samples = []
+        for metric in metrics:
+            cumulative = 0
+            for bound, count in zip(list(LATENCY_BUCKETS) + ['+Inf'], metric._get_buckets()):
+                cumulative += count
+                latency_samples.append((labels(metric, le=bound), cumulative))
+        add('latency_seconds', 'histogram', "Latency of the calls to the external server", [])
+        for label_values, value in latency_samples:
+            label_text = ','.join(f'{key}="{val}"' for key, val in label_values.items())
+            lines.append(f'{METRICS_PREFIX}_latency_seconds_bucket{{{label_text}}} {value}')
+        for metric in metrics:
+            label_text = f'model="{metric.model}",method="{metric.method}"'
+            lines.append(f'{METRICS_PREFIX}_latency_seconds_sum{{{label_text}}} {metric.latency_total}')
+            lines.append(f'{METRICS_PREFIX}_latency_seconds_count{{{label_text}}} {metric.calls}')
+
+        queue = self._get_queue_stats()
+        now = fields.Datetime.now()
+        add('outbox_pending', 'gauge', "Pending outbox entries",
+            [({'model': model_name, 'method': method}, pending)
+             for (model_name, method), (pending, _failed, _oldest) in queue.items()])
+        add('outbox_failed', 'gauge', "Outbox entries that gave up after their last attempt",
+            [({'model': model_name, 'method': method}, failed)
+             for (model_name, method), (_pending, failed, _oldest) in queue.items()])
+        add('outbox_lag_seconds', 'gauge', "Age of the oldest pending outbox entry",
+            [({'model': model_name, 'method': method}, (now - oldest).total_seconds() if oldest else 0)
+             for (model_name, method), (_pending, _failed, oldest) in queue.items()])
+        return '\n'.join(lines) + '\n'
+
+    @api.model
+    def action_open_dashboard(self):
+        self.env['db.sync.mixin']._sync_flush_metrics(force=True)
+        return self.env['ir.actions.act_window']._for_xml_id('purchase_commission.action_db_sync_metric')
+
+    def action_reset(self):
+        self.sudo().search([]).unlink()
+
+    @api.autovacuum
+    def _gc_idle_metrics(self):
+        self.search([('last_call_date', '<', fields.Datetime.now() - timedelta(days=90))]).unlink()
@@ -0,0 +1,359 @@
+from collections import defaultdict
+from datetime import timedelta
+import json
+import logging
+
+from odoo import models, fields, api
+
+from odoo.addons.purchase_commission.utils.circuit_breaker import RemoteUnavailable
+_logger = logging.getLogger(__name__)
+
+OUTBOX_PRECOMMIT_KEY = 'purchase_commission.outbox_triggered'
+MAX_ATTEMPTS = 10
+# number of entries sent with a single list-form call
+BATCH_SIZE = 200
+
+
+class UnresolvedReference(Exception):
+    """A local record referenced by an outbox entry has no remote ID yet."""
+
+
+class RemoteCallError(Exception):
+    """A remote call of a batch raised, as opposed to a local step after it."""
+
+
+class DBSyncOutbox(models.Model):
+    _name = 'db.sync.outbox'
+    _description = 'Database Synchronization Outbox'
+    _order = 'id'
+
+    model_name = fields.Char(string='Remote Model', required=True, readonly=True)
+    method = fields.Char(string='Method', required=True, readonly=True)
+    payload = fields.Text(string='Arguments', readonly=True,
+                          help="JSON list of the positional arguments sent to execute_kw")
+    kwargs = fields.Text(string='Keyword Arguments', readonly=True)
+    domain = fields.Text(string='Remote Domain', readonly=True,
+                         help="When set, the remote records are searched with this domain first: write and unlink "
+                              "apply to the records found, create only happens when nothing is found")
+    res_model = fields.Char(string='Local Model', readonly=True, index=True)
+    res_id = fields.Integer(string='Local Record ID', readonly=True, index=True)
+    remote_id_field = fields.Char(string='Remote ID Field', readonly=True,
+                                  help="Field of the local record storing the ID returned by a remote create")
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Status', default='pending', required=True, index=True, readonly=True)
+    attempts = fields.Integer(string='Attempts', readonly=True)
+    next_attempt_date = fields.Datetime(string='Next Attempt', default=fields.Datetime.now, readonly=True)
+    error = fields.Text(string='Last Error', readonly=True)
+
+    @staticmethod
+    def _dumps(value):
+        return json.dumps(value, default=str) if value is not None else False
+
+    @api.model
+    def _enqueue(self, model_name, method, args=(), kwargs=None, domain=None, record=None, remote_id_field=False):
+        """Record a remote call in the current transaction, it is sent after commit
+        by the outbox worker, in order."""
+        entry = self.create({
+            'model_name': model_name,
+            'method': method,
+            'payload': self._dumps(list(args)),
+            'kwargs': self._dumps(kwargs),
+            'domain': self._dumps(domain),
+            'res_model': record._name if record else False,
+            'res_id': record.id if record else False,
+            'remote_id_field': remote_id_field,
+        })
+        data = self.env.cr.precommit.data
+        if OUTBOX_PRECOMMIT_KEY not in data:
+            data[OUTBOX_PRECOMMIT_KEY] = True
+            self.env.ref('purchase_commission.ir_cron_process_db_sync_outbox')._trigger()
+        return entry
+
+    @api.model
+    def _cancel_pending(self, record):
+        """Drop the pending entries of a record that never reached the remote database."""
+        self.search([
+            ('res_model', '=', record._name),
+            ('res_id', 'in', record.ids),
+            ('state', '=', 'pending'),
+        ]).unlink()
+
+    def _resolve(self, value):
+        """Replace the references to local records by their remote IDs"""
+        if isinstance(value, dict):
+            if set(value) == {'__ref__'}:
+                res_model, res_id, field_name = value['__ref__']
+                record = self.env[res_model].browse(res_id).exists()
+                remote_id = record[field_name] if record else False
+                if not remote_id:
+                    raise UnresolvedReference(f"{res_model}({res_id}) has no {field_name} yet")
+                return remote_id
+            return {key: self._resolve(val) for key, val in value.items()}
+        if isinstance(value, list):
+            return [self._resolve(val) for val in value]
+        return value
+
+    def _set_remote_id(self, remote_id):
+        """Store the ID returned by a remote create on the local record"""
+        self.ensure_one()
+        if self.remote_id_field and self.res_model and remote_id:
+            record = self.env[self.res_model].browse(self.res_id).exists()
+            if record:
+                record.with_context(db_sync_skip=True).write({self.remote_id_field: remote_id})
+                self.env['db.sync.mapping']._map(self.res_model, [(record.id, remote_id)])
+
+    def _execute(self, remote_models, config):
+        self.ensure_one()
+        if self.method == 'resync':
+            # queued in queue-only mode, the record is sent with its current values
+            record = self.env[self.res_model].browse(self.res_id).exists()
+            if record:
+                record._sync_push(remote_models)
+            return True
+
+        def execute_kw(method, args, kwargs=None):
+            return remote_models.execute_kw(config['db'], config['uid'], config['password'],
+                                            self.model_name, method, args, kwargs or {})
+
+        args = self._resolve(json.loads(self.payload or '[]'))
+        kwargs = self._resolve(json.loads(self.kwargs or '{}'))
+        if self.domain:
+            remote_ids = execute_kw('search', [self._resolve(json.loads(self.domain))])
+            if self.method == 'create' and remote_ids:
+                # the record already exists remotely, update it instead
+                execute_kw('write', [remote_ids[:1]] + args, kwargs)
+                result = remote_ids[0]
+            elif self.method == 'create':
+                result = execute_kw('create', args, kwargs)
+            elif remote_ids:
+                result = execute_kw(self.method, [remote_ids] + args, kwargs)
+            else:
+                result = False
+        else:
+            result = execute_kw(self.method, args, kwargs)
+
+        if self.method == 'create':
+            self._set_remote_id(result[0] if isinstance(result, list) else result)
+        return result
+
+    @staticmethod
+    def _lookup_fields(domain):
+        """Fields of a domain made of `field = value` conditions only, such
+        lookups of several entries can be merged into one search_read."""
+        if not domain or not all(
+                isinstance(leaf, list) and len(leaf) == 3 and leaf[1] == '=' and isinstance(leaf[0], str)
+                and '.' not in leaf[0] and not isinstance(leaf[2], (list, dict)) for leaf in domain):
+            return None
+        fnames = tuple(leaf[0] for leaf in domain)
+        return fnames if len(set(fnames)) == len(fnames) else None
+
+    def _get_batch_key(self, args, kwargs, domain):
+        """Entries returning the same key are sent with a single remote call,
+        None means the entry is sent on its own."""
+        self.ensure_one()
+        if self.method == 'resync':
+            # records queued in queue-only mode are pushed together, see DBSyncMixin._sync_push
+            return (self.res_model, 'resync')
+        if kwargs:
+            return None
+        if domain is None:
+            if self.method == 'create' and len(args) == 1 and isinstance(args[0], dict):
+                return (self.model_name, 'create')
+            if self.method == 'write' and len(args) == 2 and isinstance(args[0], list):
+                return (self.model_name, 'write', json.dumps(args[1], sort_keys=True, default=str))
+            if self.method == 'unlink' and len(args) == 1 and isinstance(args[0], list):
+                return (self.model_name, 'unlink')
+            return None
+        fnames = self._lookup_fields(domain)
+        if fnames is None:
+            return None
+        if self.method == 'create' and len(args) == 1 and isinstance(args[0], dict):
+            return (self.model_name, 'lookup_create', fnames)
+        if self.method == 'write' and len(args) == 1:
+            return (self.model_name, 'lookup_write', fnames, json.dumps(args[0], sort_keys=True, default=str))
+        if self.method == 'unlink' and not args:
+            return (self.model_name, 'lookup_unlink', fnames)
+        return None
+
+    def _send_batch(self, key, calls, execute_kw, remote_models):
+        """Send the entries of self, which share the batch key, with list-form calls.
+
+        :param calls: dict mapping entry id to its resolved (args, kwargs, domain)
+        """
+        model_name, kind = key[:2]
+        if kind == 'resync':
+            try:
+                self.env[model_name].browse(self.mapped('res_id')).exists()._sync_push(remote_models)
+            except Exception as e:
+                # pushing again is safe: linked records are written again, the others matched by key
+                raise RemoteCallError(e) from e
+        elif kind == 'create':
+            remote_ids = execute_kw(model_name, 'create', [[calls[entry.id][0][0] for entry in self]])
+            for entry, remote_id in zip(self, remote_ids):
+                entry._set_remote_id(remote_id)
+        elif kind == 'write':
+            remote_ids = [rid for entry in self for rid in calls[entry.id][0][0]]
+            execute_kw(model_name, 'write', [remote_ids, calls[self[:1].id][0][1]])
+        elif kind == 'unlink':
+            execute_kw(model_name, 'unlink', [[rid for entry in self for rid in calls[entry.id][0][0]]])
+        else:
+            fnames = key[2]
+            values = {entry.id: tuple(leaf[2] for leaf in calls[entry.id][2]) for entry in self}
+            found = defaultdict(list)
+            for row in execute_kw(model_name, 'search_read', [
+                [[fname, 'in', list({vals[index] for vals in values.values()})] for index, fname in enumerate(fnames)]
+            ], {'fields': list(fnames)}):
+                row_values = tuple(row[fname][0] if isinstance(row[fname], list) else row[fname] for fname in fnames)
+                found[row_values].append(row['id'])
+            if kind == 'lookup_create':
+                missing = self.browse()
+                for entry in self:
+                    remote_ids = found.get(values[entry.id])
+                    if remote_ids:
+                        # the record already exists remotely, update it instead
+                        execute_kw(model_name, 'write', [remote_ids[:1], calls[entry.id][0][0]])
+                        entry._set_remote_id(remote_ids[0])
+                    else:
+                        missing |= entry
+                if missing:
+                    remote_ids = execute_kw(model_name, 'create', [[calls[entry.id][0][0] for entry in missing]])
+                    for entry, remote_id in zip(missing, remote_ids):
+                        entry._set_remote_id(remote_id)
+            else:
+                remote_ids = [rid for entry in self for rid in found.get(values[entry.id], [])]
+                if remote_ids and kind == 'lookup_write':
+                    execute_kw(model_name, 'write', [remote_ids, calls[self[:1].id][0][0]])
+                elif remote_ids:
+                    execute_kw(model_name, 'unlink', [remote_ids])
+
+    def _schedule_retry(self, error):
+        self.ensure_one()
+        attempts = self.attempts + 1
+        self.write({
+            'attempts': attempts,
+            'state': 'failed' if attempts >= MAX_ATTEMPTS else 'pending',
+            # exponential backoff, capped at one day
+            'next_attempt_date': fields.Datetime.now() + timedelta(minutes=min(2 ** attempts, 24 * 60)),
+            'error': str(error),
+        })
+
+    def _send_one(self, remote_models, config):
+        self.ensure_one()
+        try:
+            # a failing local write must not abort the cursor, the retry is recorded below
+            with self.env.cr.savepoint():
+                self._execute(remote_models, config)
+                self.write({'state': 'done', 'error': False})
+        except RemoteUnavailable:
+            # the circuit breaker is open, the entry is sent once the server recovers
+            return
+        except Exception as e:
+            _logger.warning("Sync outbox entry %s (%s.%s) failed: %s", self.id, self.model_name, self.method, e)
+            self._schedule_retry(e)
+
+    def _send(self, remote_models, config, auto_commit):
+        """Send the entries of self, coalescing them per model and method into
+        list-form calls. Returns the entries referencing records not synced yet."""
+
+        def execute_kw(model_name, method, args, kwargs=None):
+            try:
+                return remote_models.execute_kw(config['db'], config['uid'], config['password'],
+                                                model_name, method, args, kwargs or {})
+            except Exception as e:
+                raise RemoteCallError(e) from e
+
+        deferred = self.browse()
+        calls = {}
+        batches = defaultdict(lambda: self.browse())
+        for entry in self:
+            try:
+                args = entry._resolve(json.loads(entry.payload or '[]'))
+                kwargs = entry._resolve(json.loads(entry.kwargs or '{}'))
+                domain = entry._resolve(json.loads(entry.domain)) if entry.domain else None
+            except UnresolvedReference:
+                # e.g. a child contact queued with its parent, retry once the parent is sent
+                deferred |= entry
+                continue
+            calls[entry.id] = (args, kwargs, domain)
+            batches[entry._get_batch_key(args, kwargs, domain)] |= entry
+
+        for key, entries in batches.items():
+            if key is None:
+                for entry in entries:
+                    entry._send_one(remote_models, config)
+                    if auto_commit:
+                        self.env.cr.commit()
+                continue
+            for index in range(0, len(entries), BATCH_SIZE):
+                batch = entries[index:index + BATCH_SIZE]
+                try:
+                    with self.env.cr.savepoint():
+                        batch._send_batch(key, calls, execute_kw, remote_models)
+                        batch.write({'state': 'done', 'error': False})
+                except RemoteCallError as e:
+                    # the remote transaction of the batch is rolled back, isolate the failing entries
+                    _logger.warning("Sync outbox batch of %s %s entries failed, sending them one by one: %s",
+                                    len(batch), key[0], e.__cause__)
+                    for entry in batch:
+                        entry._send_one(remote_models, config)
+                except Exception as e:
+                    # the remote calls went through, sending the entries again would duplicate
+                    # the remote records: they are left for an administrator to check and retry
+                    _logger.exception("Sync outbox batch of %s %s entries failed after its remote calls",
+                                      len(batch), key[0])
+                    batch.write({'state': 'failed', 'error': f"Failed locally after the remote calls: {e}"})
+                if auto_commit:
+                    self.env.cr.commit()
+        return deferred
+
+    @api.model
+    def _process_outbox(self, limit=500, auto_commit=True):
+        """Send the pending entries. Only the first pending entry of each local
+        record is sent per run, and an entry that fails or waits for its retry
+        blocks the following ones, so that the operations of a record are never
+        applied out of order while the others are coalesced into batches."""
+        sync = self.env['db.sync.mixin']
+        if not sync._db_sync_enabled() or not sync._sync_probe():
+            return
+        config = sync._get_external_config()
+        remote_models = sync._get_remote_models()
+        now = fields.Datetime.now()
+        # entries waiting for their retry never take the slots of the ready ones
+        ready = self.search([
+            ('state', '=', 'pending'),
+            '|', ('next_attempt_date', '=', False), ('next_attempt_date', '<=', now),
+        ], limit=limit)
+        # the first pending entry of each record, ready or waiting, is the only one sent
+        linked = ready.filtered('res_model')
+        heads = {(res_model, res_id): head_id for res_model, res_id, head_id in self._read_group([
+            ('state', '=', 'pending'),
+            ('res_model', 'in', list(set(linked.mapped('res_model')))),
+            ('res_id', 'in', list(set(linked.mapped('res_id')))),
+        ], ['res_model', 'res_id'], ['id:min'])} if linked else {}
+        to_send = ready.filtered(lambda entry: not entry.res_model
+                                 or heads.get((entry.res_model, entry.res_id)) == entry.id)
+        postponed = ready - to_send
+
+        deferred = to_send._send(remote_models, config, auto_commit)
+        for entry in deferred._send(remote_models, config, auto_commit):
+            entry._schedule_retry(UnresolvedReference("Referenced record is not synchronized yet"))
+        if auto_commit:
+            self.env.cr.commit()
+
+        # more ready entries, or entries waiting behind a record sent in this run, go in the next run
+        if (len(ready) == limit or postponed) and to_send.filtered(lambda entry: entry.state == 'done'):
+            self.env.ref('purchase_commission.ir_cron_process_db_sync_outbox')._trigger()
+
+    @api.autovacuum
+    def _gc_done_entries(self):
+        self.search([
+            ('state', '=', 'done'),
+            ('write_date', '<', fields.Datetime.now() - timedelta(days=7)),
+        ]).unlink()
+
+    def action_retry(self):
+        self.write({'state': 'pending', 'attempts': 0, 'next_attempt_date': fields.Datetime.now()})
+        self.env.ref('purchase_commission.ir_cron_process_db_sync_outbox')._trigger()
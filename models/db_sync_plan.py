@@ -0,0 +1,176 @@
+import logging
+import time
+
+from odoo import models, fields, api
+from odoo.tools.safe_eval import safe_eval
+
+from odoo.addons.purchase_commission.models.db_sync_reconciliation import PAGE_SIZE, RECONCILE_MODELS, TIME_BUDGET
+from odoo.addons.purchase_commission.utils.sync_plan import DEFAULT_LATENCY
+_logger = logging.getLogger(__name__)
+
+# models whose records can be pushed by a plan, see action_plan()
+PUSH_MODELS = RECONCILE_MODELS + ['sale.order']
+
+
+class DBSyncPlan(models.Model):
+    _name = 'db.sync.plan'
+    _description = 'Database Synchronization Plan'
+    _order = 'id desc'
+
+    name = fields.Char(string='Name', required=True,
+                       default=lambda self: f'Plan {fields.Date.context_today(self)}')
+    scope = fields.Selection([
+        ('reconcile', 'Initial Synchronization'),
+        ('push', 'Push Records'),
+    ], string='Scope', default='reconcile', required=True,
+        help="Initial Synchronization plans a reconciliation of all the synchronized models, as run before "
+             "enabling the data synchronization; records referenced by a later model may be planned again "
+             "with it, the plan is an upper bound. Push Records plans sending the current values of the "
+             "records matching the domain as the outbox resends records queued while the server was "
+             "unavailable: one write per page of records sharing the same values.")
+    model_name = fields.Selection(selection='_selection_model_name', string='Model')
+    domain = fields.Char(string='Domain', default='[]')
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('running', 'Planning'),
+        ('done', 'Planned'),
+        ('failed', 'Failed'),
+    ], string='Status', default='draft', required=True, readonly=True)
+    step = fields.Integer(string='Step', readonly=True,
+                          help="Index of the model being planned in RECONCILE_MODELS, 1 once a push is planned")
+    checkpoint = fields.Integer(string='Checkpoint', readonly=True,
+                                help="Last local ID planned in the current step, the plan resumes after it")
+    date_planned = fields.Datetime(string='Planned On', readonly=True)
+    line_ids = fields.One2many('db.sync.plan.line', 'plan_id', string='Operations', readonly=True)
+    call_count = fields.Integer(string='Calls', compute='_compute_totals')
+    estimated_duration = fields.Float(string='Estimated Duration', compute='_compute_totals',
+                                      help="Sum of the estimated durations of the calls in hours, from their "
+                                           "measured latency")
+    error = fields.Text(string='Error', readonly=True)
+
+    @api.model
+    def _selection_model_name(self):
+        return [(model_name, self.env['ir.model']._get(model_name).name) for model_name in PUSH_MODELS]
+
+    @api.depends('line_ids.call_count', 'line_ids.estimated_duration')
+    def _compute_totals(self):
+        for plan in self:
+            plan.call_count = sum(plan.line_ids.mapped('call_count'))
+            plan.estimated_duration = sum(plan.line_ids.mapped('estimated_duration')) / 3600
+
+    def _is_planned(self):
+        self.ensure_one()
+        return self.step >= (len(RECONCILE_MODELS) if self.scope == 'reconcile' else 1)
+
+    def _run_page(self, env):
+        """Plan the next page of records in the dry-run environment env, like
+        the reconciliation job or the outbox would send it. Returns the step and
+        checkpoint to resume from, the changes of env being rolled back."""
+        self.ensure_one()
+        if self.scope == 'reconcile':
+            job = env['db.sync.reconciliation'].create({
+                'name': self.name,
+                'state': 'running',
+                'step': self.step,
+                'checkpoint': self.checkpoint,
+            })
+            job._run_page(env['db.sync.mixin']._get_remote_models())
+            return job.step, job.checkpoint
+        Model = env[self.model_name]
+        records = Model.search(safe_eval(self.domain or '[]') + [('id', '>', self.checkpoint)],
+                               order='id', limit=PAGE_SIZE)
+        if not records:
+            return 1, 0
+        records._sync_push(Model._get_remote_models())
+        return 0, records[-1].id
+
+    @api.model
+    def _get_latencies(self):
+        """Average latency in seconds measured per (model, method), per method
+        and over all the calls"""
+        self.env['db.sync.mixin']._sync_flush_metrics(force=True)
+        by_operation, by_method, total = {}, {}, [0, 0.0]
+        for metric in self.env['db.sync.metric'].sudo().search([('calls', '>', 0)]):
+            by_operation[(metric.model, metric.method)] = metric.latency_total / metric.calls
+            calls, latency = by_method.get(metric.method, (0, 0.0))
+            by_method[metric.method] = (calls + metric.calls, latency + metric.latency_total)
+            total = [total[0] + metric.calls, total[1] + metric.latency_total]
+        by_method = {method: latency / calls for method, (calls, latency) in by_method.items()}
+        return by_operation, by_method, total[1] / total[0] if total[0] else DEFAULT_LATENCY
+
+    def _add_operations(self, sync_plan, latencies):
+        """Add the calls recorded by a dry run to the operations of the plan"""
+        self.ensure_one()
+        by_operation, by_method, average = latencies
+        lines = {(line.model, line.method): line for line in self.line_ids}
+        new_lines = []
+        for (model_name, method), operation in sorted(sync_plan.operations.items()):
+            line = lines.get((model_name, method))
+            if line:
+                call_count = line.call_count + operation['calls']
+                line.write({
+                    'call_count': call_count,
+                    'record_count': line.record_count + operation['records'],
+                    'estimated_duration': line.latency / 1000 * call_count,
+                })
+                continue
+            if (model_name, method) in by_operation:
+                latency, source = by_operation[(model_name, method)], 'measured'
+            elif method in by_method:
+                latency, source = by_method[method], 'method'
+            else:
+                latency, source = average, 'average'
+            new_lines.append({
+                'plan_id': self.id,
+                'model': model_name,
+                'method': method,
+                'call_count': operation['calls'],
+                'record_count': operation['records'],
+                'sent': operation['sent'],
+                'latency': latency * 1000,
+                'latency_source': source,
+                'estimated_duration': latency * operation['calls'],
+            })
+        self.env['db.sync.plan.line'].create(new_lines)
+
+    def _run(self, time_budget=TIME_BUDGET, auto_commit=True):
+        """Plan page by page, each page in its own dry run, committing after
+        each one so that the plan resumes from its checkpoint. Returns True
+        once the plan is finished."""
+        self.ensure_one()
+        latencies = self._get_latencies()
+        Mixin = self.env['db.sync.mixin']
+        deadline = time.monotonic() + time_budget
+        while not self._is_planned():
+            position = []
+            try:
+                sync_plan = Mixin._sync_dry_run(lambda records: position.extend(self._run_page(records.env)))
+            except Exception as e:
+                if auto_commit:
+                    self.env.cr.rollback()
+                _logger.exception("Synchronization plan %s failed", self.name)
+                self.write({'state': 'failed', 'error': str(e)})
+                return True
+            self._add_operations(sync_plan, latencies)
+            self.write({'step': position[0], 'checkpoint': position[1]})
+            if auto_commit:
+                self.env.cr.commit()
+            if time.monotonic() > deadline:
+                return False
+        self.write({'state': 'done', 'date_planned': fields.Datetime.now(), 'error': False})
+        return True
+
+    @api.model
+    def _cron_run_plans(self):
+        for plan in self.search([('state', '=', 'running')], order='id'):
+            if not plan._run():
+                # out of time, continue in a new cron run
+                self.env.ref('purchase_commission.ir_cron_run_db_sync_plans')._trigger()
+                return
+
+    def action_plan(self):
+        """Run the synchronization in dry-run mode in the background and report
+        the remote calls it would make, with their estimated duration"""
+        self.line_ids.unlink()
+        self.write({'state': 'running', 'step': 0, 'checkpoint': 0, 'date_planned': False, 'error': False})
+        self.env.ref('purchase_commission.ir_cron_run_db_sync_plans')._trigger()
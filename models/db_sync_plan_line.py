@@ -0,0 +1,26 @@
+from odoo import models, fields
+
+
+class DBSyncPlanLine(models.Model):
+    _name = 'db.sync.plan.line'
+    _description = 'Database Synchronization Plan Operation'
+    _order = 'plan_id, estimated_duration desc, id'
+
+    plan_id = fields.Many2one('db.sync.plan', string='Plan', required=True, ondelete='cascade', index=True)
+    model = fields.Char(string='Remote Model', required=True, readonly=True)
+    method = fields.Char(string='Method', required=True, readonly=True)
+    call_count = fields.Integer(string='Calls', readonly=True)
+    record_count = fields.Integer(string='Records', readonly=True,
+                                  help="Records created, written or deleted by the calls, or read by them")
+    sent = fields.Boolean(string='Read', readonly=True,
+                          help="Calls reading the remote database are sent during the planning, the others are not")
+    latency = fields.Float(string='Latency (ms)', readonly=True)
+    latency_source = fields.Selection([
+        ('measured', 'Measured'),
+        ('method', 'Same Method'),
+        ('average', 'Average'),
+    ], string='Latency From', readonly=True,
+        help="Measured: average latency of these calls. Same Method: average latency of the calls of this "
+             "method on other models. Average: average latency of all the calls, or a default when none was "
+             "measured yet.")
+    estimated_duration = fields.Float(string='Estimated Duration (s)', readonly=True)
@@ -0,0 +1,89 @@
+import logging
+
+from odoo import models, api
+
+_logger = logging.getLogger(__name__)
+
+# models whose remote changes are pulled, referenced models first
+PULL_MODELS = [
+    'product.category',
+    'product.attribute',
+    'res.partner',
+    'product.template',
+    'product.pricelist',
+]
+PULL_PAGE_SIZE = 500
+# pages pulled per model in a cron run, the cron triggers itself again when there is more
+PULL_MAX_PAGES = 20
+
+
+class DBSyncPull(models.AbstractModel):
+    _name = 'db.sync.pull'
+    _description = 'Database Synchronization Pull'
+
+    def _pull_enabled(self):
+        ICP = self.env['ir.config_parameter'].sudo()
+        return self.env['db.sync.mixin']._db_sync_enabled() and \
+            ICP.get_param('purchase_commission.pull_sync', 'False') == 'True'
+
+    @api.model
+    def _get_watermark(self, model_name):
+        """Return the (write_date, id) of the last remote row applied for a model"""
+        return self.env['db.sync.watermark'].sudo()._get(model_name)
+
+    @api.model
+    def _set_watermark(self, model_name, write_date, last_id):
+        self.env['db.sync.watermark'].sudo()._set(model_name, write_date, last_id)
+
+    @api.model
+    def _pull_page(self, model_name, remote_models, limit=PULL_PAGE_SIZE):
+        """Fetch the next page of remote rows changed since the watermark of the
+        model, apply them locally and move the watermark. Returns the number of
+        rows fetched."""
+        Model = self.env[model_name]
+        config = Model._get_external_config()
+        write_date, last_id = self._get_watermark(model_name)
+        domain = []
+        if write_date:
+            # rows changed in the same second as the watermark are ordered by id
+            domain = ['|', ['write_date', '>', write_date],
+                      '&', ['write_date', '=', write_date], ['id', '>', last_id]]
+        rows = remote_models.execute_kw(
+            config['db'], config['uid'], config['password'], model_name, 'search_read', [domain], {
+                'fields': list(Model._sync_pull_fields) + [Model._sync_remote_id_field, 'write_date'],
+                'order': 'write_date, id',
+                'limit': limit,
+            })
+        if not rows:
+            return 0
+        updated = Model._sync_apply_remote_rows(rows)
+        self._set_watermark(model_name, rows[-1]['write_date'], rows[-1]['id'])
+        _logger.info("Pulled %s changed %s rows from the external database, %s records updated",
+                     len(rows), model_name, updated)
+        return len(rows)
+
+    @api.model
+    def _cron_pull_remote_changes(self, auto_commit=True):
+        if not self._pull_enabled() or not self.env['db.sync.mixin']._sync_probe():
+            return
+        remote_models = self.env['db.sync.mixin']._get_remote_models()
+        more = False
+        for model_name in PULL_MODELS:
+            try:
+                for _page in range(PULL_MAX_PAGES):
+                    if self._pull_page(model_name, remote_models) < PULL_PAGE_SIZE:
+                        break
+                    if auto_commit:
+                        self.env.cr.commit()
+                else:
+                    more = True
+            except Exception:
+                # the watermark is not moved, the rows are fetched again next time
+                _logger.exception("Failed to pull the changes of %s from the external database", model_name)
+                if auto_commit:
+                    self.env.cr.rollback()
+                continue
+            if auto_commit:
+                self.env.cr.commit()
+        if more:
+            self.env.ref('purchase_commission.ir_cron_pull_db_sync')._trigger()
@@ -0,0 +1,141 @@
+import logging
+import time
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+_logger = logging.getLogger(__name__)
+
+# models reconciled, in this order so that referenced records are linked first
+RECONCILE_MODELS = [
+    'account.account',
+    'product.category',
+    'product.attribute',
+    'res.partner',
+    'product.template',
+    'product.product',
+    'product.pricelist',
+]
+PAGE_SIZE = 200
+# a cron run stops after this many seconds and triggers itself again
+TIME_BUDGET = 240
+
+
+class DBSyncReconciliation(models.Model):
+    _name = 'db.sync.reconciliation'
+    _description = 'Database Synchronization Reconciliation'
+    _order = 'id desc'
+
+    name = fields.Char(string='Name', required=True, readonly=True,
+                       default=lambda self: f'Reconciliation {fields.Date.context_today(self)}')
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Status', default='draft', required=True, readonly=True)
+    step = fields.Integer(string='Step', readonly=True,
+                          help="Index of the model being reconciled in RECONCILE_MODELS")
+    checkpoint = fields.Integer(string='Checkpoint', readonly=True,
+                                help="Last local ID processed in the current step, the job resumes after it")
+    current_model = fields.Char(string='Current Model', compute='_compute_current_model')
+    date_start = fields.Datetime(string='Started On', readonly=True)
+    date_end = fields.Datetime(string='Finished On', readonly=True)
+    error = fields.Text(string='Last Error', readonly=True)
+    line_ids = fields.One2many('db.sync.reconciliation.line', 'reconciliation_id', string='Report', readonly=True)
+
+    @api.depends('step', 'state')
+    def _compute_current_model(self):
+        for job in self:
+            job.current_model = RECONCILE_MODELS[job.step] if job.state == 'running' and job.step < len(
+                RECONCILE_MODELS) else False
+
+    def _get_line(self, model_name):
+        self.ensure_one()
+        line = self.line_ids.filtered(lambda line: line.model == model_name)
+        return line or self.env['db.sync.reconciliation.line'].create({
+            'reconciliation_id': self.id,
+            'model': model_name,
+        })
+
+    def _run_page(self, remote_models):
+        """Reconcile the next page of local records of the current step.
+        Returns False once the step is complete."""
+        self.ensure_one()
+        model_name = RECONCILE_MODELS[self.step]
+        Model = self.env[model_name]
+        line = self._get_line(model_name)
+        records = Model.search(Model._sync_reconcile_domain() + [('id', '>', self.checkpoint)],
+                               order='id', limit=PAGE_SIZE)
+        if not records:
+            config = Model._get_external_config()
+            backlink = Model._sync_remote_id_field
+            line.write({
+                'remote_only_count': remote_models.execute_kw(
+                    config['db'], config['uid'], config['password'], model_name, 'search_count',
+                    [['|', [backlink, '=', False], [backlink, '=', 0]]]),
+                'done': True,
+            })
+            self.write({'step': self.step + 1, 'checkpoint': 0})
+            return False
+
+        unlinked = records.filtered(lambda record: not record[Model._sync_remote_id_field])
+        linked_count, created_count = unlinked._sync_reconcile(remote_models)
+        line.write({
+            'local_count': line.local_count + len(records),
+            'already_linked_count': line.already_linked_count + len(records - unlinked),
+            'linked_count': line.linked_count + linked_count,
+            'created_count': line.created_count + created_count,
+        })
+        self.checkpoint = records[-1].id
+        return True
+
+    def _run(self, time_budget=TIME_BUDGET, auto_commit=True):
+        """Process the job page by page, committing after each one so that it can
+        resume from its checkpoint. Returns True once the job is finished."""
+        self.ensure_one()
+        remote_models = self.env['db.sync.mixin']._get_remote_models()
+        deadline = time.monotonic() + time_budget
+        while self.step < len(RECONCILE_MODELS):
+            try:
+                self._run_page(remote_models)
+            except Exception as e:
+                if auto_commit:
+                    self.env.cr.rollback()
+                _logger.exception("Reconciliation %s failed on %s", self.name, RECONCILE_MODELS[self.step])
+                self.write({'state': 'failed', 'error': str(e)})
+                return True
+            if auto_commit:
+                self.env.cr.commit()
+            if time.monotonic() > deadline:
+                return False
+        self.write({'state': 'done', 'date_end': fields.Datetime.now(), 'error': False})
+        return True
+
+    @api.model
+    def _cron_run_reconciliations(self):
+        sync = self.env['db.sync.mixin']
+        if not sync._db_sync_enabled() or not sync._sync_probe():
+            return
+        for job in self.search([('state', '=', 'running')], order='id'):
+            if not job._run():
+                # out of time, continue in a new cron run
+                self.env.ref('purchase_commission.ir_cron_run_db_sync_reconciliation')._trigger()
+                return
+
+    def action_start(self):
+        """Start the job, or resume a failed one from its checkpoint"""
+        if not self.env['db.sync.mixin']._db_sync_enabled():
+            raise UserError("Enable the data synchronization before reconciling the databases.")
+        for job in self:
+            job.write({
+                'state': 'running',
+                'error': False,
+                'date_start': job.date_start or fields.Datetime.now(),
+            })
+        self.env.ref('purchase_commission.ir_cron_run_db_sync_reconciliation')._trigger()
+
+    def action_restart(self):
+        """Start over from the first model"""
+        self.line_ids.unlink()
+        self.write({'step': 0, 'checkpoint': 0, 'date_start': False, 'date_end': False})
+        self.action_start()
@@ -0,0 +1,19 @@
+from odoo import models, fields
+
+
+class DBSyncReconciliationLine(models.Model):
+    _name = 'db.sync.reconciliation.line'
+    _description = 'Database Synchronization Reconciliation Report'
+    _order = 'reconciliation_id, id'
+
+    reconciliation_id = fields.Many2one('db.sync.reconciliation', string='Reconciliation', required=True,
+                                        ondelete='cascade', index=True)
+    model = fields.Char(string='Model', required=True, readonly=True)
+    local_count = fields.Integer(string='Local Records', readonly=True)
+    already_linked_count = fields.Integer(string='Already Linked', readonly=True)
+    linked_count = fields.Integer(string='Linked', readonly=True,
+                                  help="Local records linked to the existing remote record with the same key")
+    created_count = fields.Integer(string='Created Remotely', readonly=True)
+    remote_only_count = fields.Integer(string='Remote Only', readonly=True,
+                                       help="Remote records not linked to any local record after the reconciliation")
+    done = fields.Boolean(string='Done', readonly=True)
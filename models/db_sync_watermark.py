@@ -0,0 +1,48 @@
+from odoo import models, fields, api
+
+
+class DBSyncWatermark(models.Model):
+    _name = 'db.sync.watermark'
+    _description = 'Database Synchronization Pull Watermark'
+    _order = 'model'
+    _log_access = False
+
+    model = fields.Char(string='Model', required=True, readonly=True)
+    write_date = fields.Char(string='Remote Write Date', readonly=True,
+                             help="write_date of the last remote row applied, as returned by the external server")
+    last_id = fields.Integer(string='Remote ID', readonly=True,
+                             help="ID of the last remote row applied, rows of the same write_date are ordered by ID")
+
+    _sql_constraints = [
+        ('model_uniq', 'unique(model)', 'A model can only have one watermark!'),
+    ]
+
+    def init(self):
+        # the watermarks used to be stored as system parameters, every update of
+        # which cleared the caches of all the workers
+        self.env.cr.execute("""
+            INSERT INTO db_sync_watermark (model, write_date, last_id)
+            SELECT substr(key, length('purchase_commission.pull_watermark.') + 1),
+                   split_part(value, ',', 1), COALESCE(NULLIF(split_part(value, ',', 2), ''), '0')::int
+              FROM ir_config_parameter
+             WHERE key LIKE 'purchase_commission.pull_watermark.%' AND value != ''
+            ON CONFLICT DO NOTHING
+        """)
+        self.env.cr.execute("""
+            DELETE FROM ir_config_parameter WHERE key LIKE 'purchase_commission.pull_watermark.%'
+        """)
+
+    @api.model
+    def _get(self, model_name):
+        """Return the (write_date, id) of the last remote row applied for a model"""
+        self.env.cr.execute("SELECT write_date, last_id FROM db_sync_watermark WHERE model = %s", (model_name,))
+        row = self.env.cr.fetchone()
+        return (row[0] or False, row[1] or 0) if row else (False, 0)
+
+    @api.model
+    def _set(self, model_name, write_date, last_id):
+        self.env.cr.execute("""
+            INSERT INTO db_sync_watermark (model, write_date, last_id) VALUES (%s, %s, %s)
+            ON CONFLICT (model) DO UPDATE SET write_date = EXCLUDED.write_date, last_id = EXCLUDED.last_id
+        """, (model_name, write_date, last_id))
+        self.invalidate_model()
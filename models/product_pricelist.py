@@ -1,172 +1,191 @@
 from odoo import models, api, fields
 from odoo.tools.misc import format_amount
 import re
-import xmlrpc.client
 import logging
 _logger = logging.getLogger(__name__)
-from copy import deepcopy
+
+from odoo.addons.purchase_commission.models.product_pricelist_item import ITEM_KEY_FIELDS, ITEM_VALUE_FIELDS
+
+# items read and sent per call by sync_pricelist
+ITEM_PAGE_SIZE = 500
 
 
 class ProductPricelist(models.Model):
-    _inherit = 'product.pricelist'
+    _inherit = ['product.pricelist', 'db.sync.mixin']
     remote_pricelist_id = fields.Integer(string='Remote Pricelist ID')
 
-    def _get_external_config(self):
-        ICP = self.env['ir.config_parameter'].sudo()
-        return {
-            'url': ICP.get_param('purchase_commission.external_server_url', ''),
-            'db': ICP.get_param('purchase_commission.external_server_db', ''),
-            'uid': int(ICP.get_param('purchase_commission.external_server_uid', 0)),
-            'password': ICP.get_param('purchase_commission.external_server_password', '')
-        }
-
-    def _db_sync_enabled(self):
-        # if data_sync is true return true else false
-        ICP = self.env['ir.config_parameter'].sudo()
-        return ICP.get_param('purchase_commission.data_sync', 'False') == 'True'
-
-    def write(self, vals):
-        if self._db_sync_enabled():
-            _logger.warning('Data sync is enabled, attempting to sync partners to external DB')
-            config = self._get_external_config()
-            url = config['url']
-            db = config['db']
-            uid = config['uid']
-            password = config['password']
-            try:
-                remote_models = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/object')
-                for pricelist in self:
-                    remote_vals = deepcopy(vals)
-                    if 'name' in remote_vals:
-                        remote_vals['name'] = vals['name']
-                    if 'currency_id' in remote_vals:
-                        currency_name = self.env['res.currency'].browse(vals['currency_id']).name
-                        # search currency name in remote db
-                        remote_currency_id = remote_models.execute_kw(db, uid, password, 'res.currency', 'search',
-                                                                      [[['name', '=', currency_name]]])
-                        if remote_currency_id:
-                            remote_vals['currency_id'] = remote_currency_id[0]
-                        else:
-                            remote_vals.pop('currency_id', None)
-                    if 'company_id' in remote_vals:
-                        company_name = self.env['res.company'].browse(vals['company_id']).name
-                        remote_company_id = remote_models.execute_kw(db, uid, password, 'res.company', 'search',
-                                                                     [[['name', '=', company_name]]])
-                        if remote_company_id:
-                            remote_vals['company_id'] = remote_company_id[0]
-                        else:
-                            remote_vals.pop('company_id', None)
-                    if remote_vals.get('item_ids', False):
-                        for i, item in enumerate(remote_vals['item_ids']):
-                            if len(item) == 3 and item[0] == 0:
-                                if item[2].get('categ_id', False):
-                                    categ_id = self.env['product.category'].browse(item[2]['categ_id'])
-                                    remote_categ_id = categ_id.remote_category_id
-                                    if remote_categ_id:
-                                        item[2]['categ_id'] = remote_categ_id
-                                    else:
-                                        item[2]['categ_id'] = False
-                                        del vals['item_ids'][i]
-                                        logging.info("This category is not synced yet. Please sync the category first before adding to pricelist item.")
-                                if item[2].get('product_tmpl_id', False):
-                                    product_tmpl_id = self.env['product.template'].browse(item[2]['product_tmpl_id'])
-                                    remote_product_tmpl_id = product_tmpl_id.related_product_id
-                                    if remote_product_tmpl_id:
-                                        item[2]['product_tmpl_id'] = remote_product_tmpl_id
-                                    else:
-                                        item[2]['product_tmpl_id'] = False
-                                        logging.error("Product Template must be synced before adding to pricelist item.")                                        # if product template is not synced remove this item from vals
-                                        del vals['item_ids'][i]
-
-                                if item[2].get('product_id', False):
-                                    main_db_product_id = self.env['product.product'].browse(item[2].get('product_id'))
-                                    remote_product_id = main_db_product_id.remote_product_id
-                                    if remote_product_id:
-                                        item[2]['product_id'] = remote_product_id
-                                    else:
-                                        item[2]['product_id'] = False
-                                        del vals['item_ids'][i]
-                                        logging.info('This product is not synced yet. Please sync the product first before adding to pricelist item.')
-                                if item[2].get('pricelist_id', False):
-                                    item[2]['pricelist_id'] = pricelist.remote_pricelist_id
-                            if len(item) == 3 and item[0] == 1:
-                                remote_pricelist_item_id = self.env['product.pricelist.item'].browse(item[1]).remote_pricelist_item_id
-                                if remote_pricelist_item_id:
-                                    item[1] = remote_pricelist_item_id
-                                else:
-                                    logging.error("Pricelist item must be synced before updating.")
-                                    del vals['item_ids'][i]
-                                if item[2].get('categ_id', False):
-                                    categ_id = self.env['product.category'].browse(item[2]['categ_id'])
-                                    remote_categ_id = categ_id.remote_category_id
-                                    if remote_categ_id:
-                                        item[2]['categ_id'] = remote_categ_id
-                                    else:
-                                        item[2]['categ_id'] = False
-                                        del vals['item_ids'][i]
-                                        logging.info(
-                                            "This category is not synced yet. Please sync the category first before adding to pricelist item.")
-                                if item[2].get('product_tmpl_id', False):
-                                    product_tmpl_id = self.env['product.template'].browse(item[2]['product_tmpl_id'])
-                                    remote_product_tmpl_id = product_tmpl_id.related_product_id
-                                    if remote_product_tmpl_id:
-                                        item[2]['product_tmpl_id'] = remote_product_tmpl_id
-                                    else:
-                                        item[2]['product_tmpl_id'] = False
-                                        logging.error(
-                                            "Product Template must be synced before adding to pricelist item.")  # if product template is not synced remove this item from vals
-                                        del vals['item_ids'][i]
-
-                                if item[2].get('product_id', False):
-                                    main_db_product_id = self.env['product.product'].browse(item[2].get('product_id'))
-                                    remote_product_id = main_db_product_id.remote_product_id
-                                    if remote_product_id:
-                                        item[2]['product_id'] = remote_product_id
-                                    else:
-                                        item[2]['product_id'] = False
-                                        del vals['item_ids'][i]
-                                        logging.info(
-                                            'This product is not synced yet. Please sync the product first before adding to pricelist item.')
-                                if item[2].get('pricelist_id', False):
-                                    item[2]['pricelist_id'] = pricelist.remote_pricelist_id
-                            if len(item) == 2 and item[0] == 2:
-                                remote_pricelist_item_id = self.env['product.pricelist.item'].browse(item[1]).remote_pricelist_item_id
-                                if remote_pricelist_item_id:
-                                    item[1] = remote_pricelist_item_id
-                                else:
-                                    logging.error("Pricelist item must be synced before deleting.")
-                                    del vals['item_ids'][i]
-                    print('Remote Vals:', remote_vals)
-                    remote_models.execute_kw(db, uid, password, 'product.pricelist', 'write', [[pricelist.remote_pricelist_id], remote_vals])
-                return super(ProductPricelist, self).write(vals)
+    _sync_remote_id_field = 'remote_pricelist_id'
+    _sync_fields = ('name', 'currency_id', 'company_id', 'item_ids')
+    _sync_translators = {
+        'currency_id': '_sync_translate_currency',
+        'company_id': '_sync_translate_company',
+        'item_ids': '_sync_translate_items',
+    }
+    _sync_pull_fields = ('name',)
 
-            except Exception as e:
-                _logger.error(f"Failed to sync pricelist to external DB: {e}")
-        return super(ProductPricelist, self).write(vals)
+    def _sync_translate_currency(self, value, remote_models):
+        currency = value if isinstance(value, models.BaseModel) else self.env['res.currency'].browse(value or [])
+        # currencies are matched by name, a currency missing remotely is left out
+        return currency and self._remote_lookup('res.currency', [['name', '=', currency.name]], remote_models) or None
+
+    def _sync_translate_company(self, value, remote_models):
+        company = value if isinstance(value, models.BaseModel) else self.env['res.company'].browse(value or [])
+        if not company:
+            return False
+        return self._remote_lookup('res.company', [['name', '=', company.name]], remote_models) or None
+
+    def _sync_translate_items(self, value, remote_models):
+        # items are sent by the keyed diff once the pricelist is linked, see _sync_items_diff
+        return None
+
+    def _sync_reconcile(self, remote_models):
+        result = super()._sync_reconcile(remote_models)
+        transform = self._sync_price_transform()
+        for pricelist in self.filtered('remote_pricelist_id'):
+            pricelist._sync_items_diff(remote_models, transform)
+        return result
+
+    def _sync_push(self, remote_models):
+        result = super()._sync_push(remote_models)
+        transform = self._sync_price_transform()
+        for pricelist in self.filtered('remote_pricelist_id'):
+            pricelist._sync_items_diff(remote_models, transform)
+        return result
+
+    def _sync_written(self, vals, remote_models):
+        if 'item_ids' in vals:
+            # the items diff reads both sides page by page, the outbox runs it
+            # in the background, see _sync_push
+            self._sync_enqueue_resync()
+
+    def _sync_on_error(self, records, error):
+        self._remote_lookup_invalidate('res.currency')
+        self._remote_lookup_invalidate('res.company')
+        return super()._sync_on_error(records, error)
 
     def sync_pricelist(self):
-        if self._db_sync_enabled():
-            config = self._get_external_config()
-            url = config['url']
-            db = config['db']
-            uid = config['uid']
-            password = config['password']
-            remote_models = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/object')
-            for pricelist in self:
-                if pricelist.remote_pricelist_id:
-                    main_db_pricelist_items = self.env['product.pricelist.item'].search(
-                        [('pricelist_id', '=', pricelist.id)])
-                    remote_db_pricelist_items = remote_models.execute_kw(db, uid, password,
-                                                                        'product.pricelist.item', 'search_read',
-                                                                        [[['pricelist_id', '=', pricelist.remote_pricelist_id]]],
-                                                                         {'fields':['id']})
-                    remote_db_pricelist_item_ids = [item['id'] for item in remote_db_pricelist_items]
-                    main_db_pricelist_item_ids = [item.id for item in main_db_pricelist_items]
-                    for remote_id, main_id in zip(remote_db_pricelist_item_ids, main_db_pricelist_item_ids):
-                        try:
-                            remote_models.execute_kw(db, uid, password, 'product.pricelist.item', 'write',
-                                                        [[remote_id], {'remote_pricelist_item_id' : main_id}])
-                            _logger.info(f'Successfully updated remote pricelist item {remote_id} with main DB ID {main_id}')
-                        except Exception as e:
-                            _logger.error(f"Failed to update remote pricelist item {remote_id}: {e}")
-                        self.env['product.pricelist.item'].browse(main_id).write({'remote_pricelist_item_id' : remote_id})
+        """Synchronize the items of the linked pricelists as a keyed diff: both
+        sides are read page by page, items are matched by their natural key and
+        only the missing, changed and extra remote items are created, updated
+        and deleted, with one call per page for each."""
+        if not self._db_sync_enabled():
+            return
+        remote_models = self._get_remote_models()
+        transform = self._sync_price_transform()
+        for pricelist in self.filtered('remote_pricelist_id'):
+            try:
+                created, updated, deleted, skipped = pricelist._sync_items_diff(remote_models, transform)
+                _logger.info(f"Pricelist {pricelist.name} synchronized: {created} items created, {updated} updated, "
+                             f"{deleted} deleted remotely, {skipped} skipped")
+            except Exception as e:
+                _logger.error(f"Failed to sync the items of pricelist {pricelist.name}: {e}")
+
+    def _sync_read_remote_items(self, remote_models):
+        """Remote items of the pricelist, yielded in pages of ITEM_PAGE_SIZE"""
+        config = self._get_external_config()
+        last_id = 0
+        while True:
+            rows = remote_models.execute_kw(
+                config['db'], config['uid'], config['password'], 'product.pricelist.item', 'search_read',
+                [[['pricelist_id', '=', self.remote_pricelist_id], ['id', '>', last_id]]],
+                {'fields': list(ITEM_KEY_FIELDS + ITEM_VALUE_FIELDS) + ['remote_pricelist_item_id'],
+                 'order': 'id', 'limit': ITEM_PAGE_SIZE})
+            if rows:
+                yield rows
+            if len(rows) < ITEM_PAGE_SIZE:
+                return
+            last_id = rows[-1]['id']
+
+    def _sync_read_local_items(self):
+        """Items of the pricelist, yielded in pages of ITEM_PAGE_SIZE"""
+        Item = self.env['product.pricelist.item']
+        last_id = 0
+        while True:
+            items = Item.search([('pricelist_id', '=', self.id), ('id', '>', last_id)], order='id',
+                                limit=ITEM_PAGE_SIZE)
+            if items:
+                yield items
+            if len(items) < ITEM_PAGE_SIZE:
+                return
+            last_id = items[-1].id
+
+    def _sync_items_diff(self, remote_models, transform):
+        """Returns the number of created, updated, deleted and skipped items"""
+        self.ensure_one()
+        config = self._get_external_config()
+        Item = self.env['product.pricelist.item']
+        normalize = Item._sync_normalize
+        # remote items indexed by key, only the values compared are kept
+        remote_items, to_delete = {}, []
+        for rows in self._sync_read_remote_items(remote_models):
+            for row in rows:
+                key = Item._sync_item_key(row)
+                if key in remote_items:
+                    # duplicate of an item already matched by its key
+                    to_delete.append(row['id'])
+                    continue
+                remote_items[key] = (row['id'], row['remote_pricelist_item_id'],
+                                     tuple(normalize(fname, row[fname]) for fname in ITEM_VALUE_FIELDS))
+
+        created = updated = skipped = 0
+        for items in self._sync_read_local_items():
+            to_create, create_vals = Item.browse(), []
+            to_update, update_vals, update_ids, changed_fnames = Item.browse(), [], [], set()
+            for item in items:
+                vals = item._sync_prepare_remote_vals()
+                if vals is None:
+                    _logger.info(f"Pricelist item {item.id} applies to records not synchronized yet, skipped")
+                    skipped += 1
+                    continue
+                transform.pricelist_item_prices([vals])
+                match = remote_items.pop(Item._sync_item_key(vals), None)
+                if not match:
+                    to_create |= item
+                    create_vals.append(dict(vals, pricelist_id=self.remote_pricelist_id,
+                                            remote_pricelist_item_id=item.id))
+                    continue
+                remote_id, backlink, values = match
+                changed = [fname for fname, value in zip(ITEM_VALUE_FIELDS, values)
+                           if normalize(fname, vals[fname]) != value]
+                if changed or backlink != item.id or item.remote_pricelist_item_id != remote_id:
+                    to_update |= item
+                    update_vals.append(vals)
+                    changed_fnames.update(changed)
+                    update_ids.append(remote_id)
+            if create_vals:
+                remote_ids = remote_models.execute_kw(
+                    config['db'], config['uid'], config['password'], 'product.pricelist.item', 'create',
+                    [create_vals])
+                to_create._sync_link(remote_ids)
+                created += len(to_create)
+            if to_update:
+                fnames = [fname for fname in ITEM_VALUE_FIELDS if fname in changed_fnames]
+                self._sync_load_items(to_update, update_ids, update_vals, fnames, remote_models)
+                to_update._sync_link(update_ids)
+                updated += len(to_update)
+
+        # remote items without a local item with the same key
+        to_delete += [remote_id for remote_id, _backlink, _values in remote_items.values()]
+        for index in range(0, len(to_delete), ITEM_PAGE_SIZE):
+            remote_models.execute_kw(config['db'], config['uid'], config['password'], 'product.pricelist.item',
+                                     'unlink', [to_delete[index:index + ITEM_PAGE_SIZE]])
+        return created, updated, len(to_delete), skipped
+
+    def _sync_load_items(self, items, remote_ids, vals_list, fnames, remote_models):
+        """Write the fields fnames of vals_list, different for each item, on the
+        remote items with a single load on database IDs, along with the
+        backlinks of the local items"""
+        config = self._get_external_config()
+        Item = self.env['product.pricelist.item']
+        columns = ['.id', 'remote_pricelist_item_id'] + [
+            f'{fname}/.id' if Item._fields[fname].type == 'many2one' else fname for fname in fnames]
+        rows = []
+        for item, remote_id, vals in zip(items, remote_ids, vals_list):
+            # a row sets all the columns, the unchanged values are loaded again as they are
+            rows.append([str(remote_id), str(item.id)] + [
+                '' if vals[fname] is False else str(vals[fname]) for fname in fnames])
+        result = remote_models.execute_kw(config['db'], config['uid'], config['password'],
+                                          'product.pricelist.item', 'load', [columns, rows])
+        errors = [message['message'] for message in result.get('messages', []) if message.get('type') == 'error']
+        if errors or not result.get('ids'):
+            raise ValueError(f"Failed to update the remote pricelist items: {'; '.join(errors)}")
@@ -1,7 +1,51 @@
 from odoo import api, fields, models
 
+# fields identifying an item in both databases, and fields the sync copies
+ITEM_KEY_FIELDS = ('applied_on', 'product_tmpl_id', 'product_id', 'categ_id', 'min_quantity', 'date_start', 'date_end')
+ITEM_VALUE_FIELDS = ('compute_price', 'fixed_price', 'percent_price', 'base', 'base_pricelist_id', 'price_discount',
+                     'price_surcharge', 'price_round', 'price_min_margin', 'price_max_margin')
+
 
 class ProductPricelistItem(models.Model):
-    _inherit = 'product.pricelist.item'
+    _inherit = ['product.pricelist.item', 'db.sync.mixin']
+
+    remote_pricelist_item_id = fields.Integer(string="Remote Pricelist Item ID")
+
+    _sync_remote_id_field = 'remote_pricelist_item_id'
+
+    @staticmethod
+    def _sync_normalize(fname, value):
+        """Comparable form of a value, local or read remotely"""
+        if isinstance(value, (list, tuple)):
+            # many2one read remotely
+            return value[0] if value else False
+        if isinstance(value, float):
+            return round(value, 6)
+        return value or False
+
+    def _sync_prepare_remote_vals(self):
+        """Values of the item in the remote database, or None when a record it
+        applies to is not linked"""
+        self.ensure_one()
+        references = {
+            'product_tmpl_id': self.product_tmpl_id.related_product_id if self.product_tmpl_id else False,
+            'product_id': self.product_id.remote_product_id if self.product_id else False,
+            'categ_id': self.categ_id.remote_category_id if self.categ_id else False,
+            'base_pricelist_id': self.base_pricelist_id.remote_pricelist_id if self.base_pricelist_id else False,
+        }
+        if any(self[fname] and not remote_id for fname, remote_id in references.items()):
+            return None
+        vals = {}
+        for fname in ITEM_KEY_FIELDS + ITEM_VALUE_FIELDS:
+            if fname in references:
+                vals[fname] = references[fname]
+            elif self._fields[fname].type == 'datetime':
+                vals[fname] = fields.Datetime.to_string(self[fname]) if self[fname] else False
+            else:
+                vals[fname] = self[fname]
+        return vals
 
-    remote_pricelist_item_id = fields.Integer(string="Remote Pricelist Item ID")
\ No newline at end of file
+    @api.model
+    def _sync_item_key(self, vals):
+        """Natural key of an item given its remote values, see _sync_prepare_remote_vals()"""
+        return tuple(self._sync_normalize(fname, vals[fname]) for fname in ITEM_KEY_FIELDS)
@@ -1,7 +1,64 @@
+from collections import defaultdict
+
 from odoo import models, fields, api
 
 
 class ProductProduct(models.Model):
-    _inherit = 'product.product'
+    _inherit = ['product.product', 'db.sync.mixin']
+
+    remote_product_id = fields.Integer(string='Remote Product ID')
+
+    _sync_remote_id_field = 'remote_product_id'
+
+    def _sync_get_remote_combinations(self, remote_template_ids, remote_models):
+        """Remote variants of the given remote templates keyed by (remote template
+        ID, frozenset of remote attribute value IDs), their combination"""
+        config = self._get_external_config()
+        values = defaultdict(set)
+        variant_templates = {}
+        for row in remote_models.execute_kw(
+                config['db'], config['uid'], config['password'], 'product.template.attribute.value', 'search_read',
+                [[['product_tmpl_id', 'in', remote_template_ids]]],
+                {'fields': ['product_tmpl_id', 'product_attribute_value_id', 'ptav_product_variant_ids']}):
+            for remote_variant_id in row['ptav_product_variant_ids']:
+                values[remote_variant_id].add(row['product_attribute_value_id'][0])
+                variant_templates[remote_variant_id] = row['product_tmpl_id'][0]
+        combinations = {(variant_templates[remote_variant_id], frozenset(value_ids)): remote_variant_id
+                        for remote_variant_id, value_ids in values.items()}
+        # templates without variant attributes have a single variant with an empty combination
+        plain_template_ids = set(remote_template_ids) - set(variant_templates.values())
+        if plain_template_ids:
+            for row in remote_models.execute_kw(
+                    config['db'], config['uid'], config['password'], 'product.template', 'search_read',
+                    [[['id', 'in', list(plain_template_ids)]]], {'fields': ['product_variant_ids']}):
+                if len(row['product_variant_ids']) == 1:
+                    combinations[(row['id'], frozenset())] = row['product_variant_ids'][0]
+        return combinations
 
-    remote_product_id = fields.Integer(string='Remote Product ID')
\ No newline at end of file
+    def _sync_reconcile(self, remote_models):
+        """Variants are created remotely along with their template, link them to
+        the variant of the remote template with the same combination of
+        attribute values."""
+        config = self._get_external_config()
+        variants = self.filtered(lambda variant: variant.product_tmpl_id.related_product_id)
+        if not variants:
+            return 0, 0
+        combinations = self._sync_get_remote_combinations(
+            variants.product_tmpl_id.mapped('related_product_id'), remote_models)
+        remote_value_ids = variants.product_template_attribute_value_ids.product_attribute_value_id \
+            ._get_remote_value_ids(remote_models, config)
+        linked = self.env['db.sync.mapping'].sudo()._get_local_ids(self._name, list(combinations.values()))
+        to_link, link_ids = self.browse(), []
+        for variant in variants:
+            local_value_ids = variant.product_template_attribute_value_ids.product_attribute_value_id.ids
+            if not all(value_id in remote_value_ids for value_id in local_value_ids):
+                # a value of the combination is not linked, the variant cannot be matched
+                continue
+            key = (variant.product_tmpl_id.related_product_id,
+                   frozenset(remote_value_ids[value_id] for value_id in local_value_ids))
+            remote_variant_id = combinations.pop(key, None)
+            if remote_variant_id and linked.get(remote_variant_id, variant.id) == variant.id:
+                to_link |= variant
+                link_ids.append(remote_variant_id)
+        to_link._sync_link(link_ids, remote_models)
+        return len(to_link), 0
@@ -1,350 +1,140 @@
-from odoo import models, fields, api
-from odoo.exceptions import ValidationError
-import xmlrpc.client
-from copy import deepcopy
+from odoo import models, fields
 import logging
 _logger = logging.getLogger(__name__)
 
 
-class ProductTemplate(models.Model):
-    _inherit = 'product.template'
-
-    related_product_id = fields.Integer(
-        string="Remote Product ID",
-        help="Stores the product ID of this product in the external database.")
-
-    # @api.constrains('name')
-    # def _check_unique_name(self):
-    #     """Ensure product name is unique (case-insensitive) locally"""
-    #     for product in self:
-    #         if product.name:
-    #             existing = self.env['product.template'].search(
-    #                 [('id', '!=', product.id), ('name', '=ilike', product.name)])
-    #             if existing:
-    #                 raise ValidationError("A product with the same name already exists.")
-
-    def _get_external_config(self):
-        ICP = self.env['ir.config_parameter'].sudo()
-        return {
-            'url': ICP.get_param('purchase_commission.external_server_url', ''),
-            'db': ICP.get_param('purchase_commission.external_server_db', ''),
-            'uid': int(ICP.get_param('purchase_commission.external_server_uid', 0)),
-            'password': ICP.get_param('purchase_commission.external_server_password', '')
-        }
-
-    def _db_sync_enabled(self):
-        # if data_sync is true return true else false
-        ICP = self.env['ir.config_parameter'].sudo()
-        return ICP.get_param('purchase_commission.data_sync', 'False') == 'True'
-
-    def _sale_sync_enabled(self):
-        # if sale_sync is true return true else false
-        ICP = self.env['ir.config_parameter'].sudo()
-        return ICP.get_param('purchase_commission.sale_sync', 'False') == 'True'
+def _m2m_ids(commands):
+    """IDs referenced by many2many commands"""
+    ids = []
+    for command in commands or []:
+        if command[0] in (3, 4):
+            ids.append(command[1])
+        elif command[0] == 6:
+            ids.extend(command[2])
+    return ids
 
-    def _sales_decreased_percentage(self):
-        ICP = self.env['ir.config_parameter'].sudo()
-        decrease_percentage = ICP.get_param('purchase_commission.sale_decreased_percentage', 0.0)
-        try:
-            decrease_percentage = float(decrease_percentage)
-        except ValueError:
-            decrease_percentage = 0.0
-        return decrease_percentage
 
-    @api.model
-    def create(self, vals_list):
-        """Handle both single and multiple record creation during import"""
-        # Ensure vals_list is always a list for consistency
-        single_record = isinstance(vals_list, dict)
-        if single_record:
-            vals_list = [vals_list]
-        if self._db_sync_enabled():
-            _logger.info("Data sync is enabled. Proceeding with external DB operations.")
-            config = self._get_external_config()
-            url = config['url']
-            db = config['db']
-            uid = config['uid']
-            password = config['password']
-            try:
-                _logger.info(f"Connecting to external server at {url}")
-                remote_models = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/object')
-            except Exception as e:
-                raise ValidationError(f"Failed to connect to external server: {e}")
+def _translate_m2m(commands, remote_ids):
+    """Many2many commands on the remote IDs given by remote_ids, a dict keyed
+    by local ID, the unknown IDs are left out"""
+    translated = []
+    for command in commands or []:
+        if command[0] in (3, 4) and command[1] in remote_ids:
+            translated.append((command[0], remote_ids[command[1]]))
+        elif command[0] == 6:
+            translated.append((6, 0, [remote_ids[local_id] for local_id in command[2] if local_id in remote_ids]))
+        elif command[0] == 5:
+            translated.append((5, 0, 0))
+    return translated
 
-            # Process each record
-            for vals in vals_list:
-                # Check for existing product by name (case-insensitive) in remote DB
-                try:
-                    vals.pop('combo_ids', None)
-                    existing_records = remote_models.execute_kw(db, uid, password, 'product.template', 'search',
-                                                                [[['name', '=ilike', vals.get('name')]]])
-                    if not existing_records:
-                        copied_vals = deepcopy(vals)
-                        if copied_vals.get('attribute_line_ids', False):
-                            for attr_line in copied_vals['attribute_line_ids']:
-                                if len(attr_line) > 2 and isinstance(attr_line[2], dict):
-                                    # Process attribute_id
-                                    attribute_id = attr_line[2].get('attribute_id', False)
-                                    if attribute_id:
-                                        attribute = self.env['product.attribute'].browse(attribute_id)
-                                        remote_attribute_id = remote_models.execute_kw(
-                                            db, uid, password, 'product.attribute', 'search',
-                                            [[['name', '=', attribute.name]]], {'limit': 1}
-                                        )
-                                        if remote_attribute_id:
-                                            attr_line[2]['attribute_id'] = remote_attribute_id[0]
-                                        else:
-                                            new_remote_attribute_id = remote_models.execute_kw(
-                                                db, uid, password, 'product.attribute', 'create',
-                                                [{'name': attribute.name}]
-                                            )
-                                            attr_line[2]['attribute_id'] = new_remote_attribute_id
 
-                                    # Process value_ids
-                                    if 'value_ids' in attr_line[2]:
-                                        for value in attr_line[2]['value_ids']:
-                                            if len(value) > 1:
-                                                main_value_id = value[1]
-                                                main_value = self.env['product.attribute.value'].browse(main_value_id)
-                                                remote_value_id = remote_models.execute_kw(
-                                                    db, uid, password, 'product.attribute.value', 'search',
-                                                    [[['name', '=', main_value.name]]], {'limit': 1}
-                                                )
-                                                if remote_value_id:
-                                                    value[1] = remote_value_id[0]
-                                                else:
-                                                    new_remote_value_id = remote_models.execute_kw(
-                                                        db, uid, password, 'product.attribute.value', 'create',
-                                                        [{'name': main_value.name}]
-                                                    )
-                                                    value[1] = new_remote_value_id
-
-                        if copied_vals.get('seller_ids', False):
-                            for i, seller_data in enumerate(copied_vals['seller_ids']):
-                                if len(seller_data) > 2 and isinstance(seller_data[2], dict):
-                                    partner_id = seller_data[2].get('partner_id', False)
-                                    if partner_id:
-                                        partner = self.env['res.partner'].browse(partner_id)
-                                        if partner.related_partner_id:
-                                            copied_vals['seller_ids'][i][2]['partner_id'] = partner.related_partner_id
-                        # Handle case when income/expense account is set
-                        if copied_vals.get('property_account_income_id', False):
-                            account_id = copied_vals['property_account_income_id']
-                            account = self.env['account.account'].browse(account_id)
-                            if account.remote_account_id:
-                                copied_vals['property_account_income_id'] = account.remote_account_id
-                        if copied_vals.get('property_account_expense_id', False):
-                            account_id = copied_vals['property_account_expense_id']
-                            account = self.env['account.account'].browse(account_id)
-                            if account.remote_account_id:
-                                copied_vals['property_account_expense_id'] = account.remote_account_id
-                        if copied_vals.get('categ_id', False):
-                            category_id = copied_vals['categ_id']
-                            category = self.env['product.category'].browse(category_id)
-                            if category.remote_category_id:
-                                copied_vals['categ_id'] = category.remote_category_id
-                        if copied_vals.get('list_price', False) and self._sale_sync_enabled():
-                            decrease_percentage = self._sales_decreased_percentage()
-                            original_price = copied_vals['list_price']
-                            decreased_price = original_price - (original_price * decrease_percentage / 100)
-                            copied_vals['list_price'] = decreased_price
-                        if copied_vals.get('standard_price', False) and self._sale_sync_enabled():
-                            decrease_percentage = self._sales_decreased_percentage()
-                            original_price = copied_vals['standard_price']
-                            decreased_price = original_price - (original_price * decrease_percentage / 100)
-                            copied_vals['standard_price'] = decreased_price
-                        remote_models.execute_kw(db, uid, password, 'product.template', 'create', [copied_vals])
-                except Exception as e:
-                    raise ValidationError(f"Error during creating product in remote database: {e}")
-            # Create the records in main database
-            new_products = super(ProductTemplate, self).create(vals_list)
-            for product in new_products:
-                if not product.related_product_id:
-                    # find related record id from remote db
-                    remote_record = remote_models.execute_kw(db, uid, password, 'product.template', 'search',
-                                                             [[['name', '=', product.name]]], {'limit': 1})
-
-                    # write related partner id from main  database to remote record
-                    remote_models.execute_kw(db, uid, password, 'product.template', 'write',
-                                             [remote_record, {'related_product_id': product.id}])
+class ProductTemplate(models.Model):
+    _inherit = ['product.template', 'db.sync.mixin']
 
-                    # write related partner id from remote database to main record
-                    product.write({'related_product_id': remote_record[0] if remote_record else False})
-                    # handle case when product variants are available
-                    if product.product_variant_ids:
-                        remote_variants = remote_models.execute_kw(
-                            db, uid, password, 'product.template', 'search_read',
-                                [[['id', '=', remote_record]]],
-                                {'fields': ['product_variant_ids']}
-                        )
-                        remote_variants = remote_variants[0]['product_variant_ids'] if remote_variants else []
-                        remote_variants = sorted(remote_variants)
-                        main_db_variants = [id for id in product.product_variant_ids]
-                        main_db_variants = sorted(main_db_variants, key=lambda x: x.id)
-                        for remote_product_id, main_product in zip(remote_variants, main_db_variants):
-                            main_product.write({'remote_product_id': remote_product_id})
-                            remote_models.execute_kw(db, uid, password, 'product.product', 'write',
-                                                     [remote_product_id, {'remote_product_id': main_product.id}])
-            return new_products
-        else:
-            _logger.info("Data sync not enabled; skipping external DB operation.")
-            return super(ProductTemplate, self).create(vals_list)
+    related_product_id = fields.Integer(
+        string="Remote Product ID",
+        help="Stores the product ID of this product in the external database.")
+    is_own_product = fields.Boolean(related='categ_id.is_own_product', store=True, index=True)
+
+    _sync_remote_id_field = 'related_product_id'
+    _sync_fields = ('name', 'type', 'list_price', 'standard_price', 'default_code', 'sale_ok', 'purchase_ok',
+                    'categ_id', 'property_account_income_id', 'property_account_expense_id', 'attribute_line_ids',
+                    'packaging_ids')
+    _sync_translators = {
+        'attribute_line_ids': '_sync_translate_attribute_lines',
+        'packaging_ids': '_sync_translate_packagings',
+    }
+    # prices are not pulled, the remote ones are decreased by the sale sync percentage
+    _sync_pull_fields = ('name', 'default_code', 'sale_ok', 'purchase_ok', 'categ_id')
 
     def write(self, vals):
-        vals.pop('combo_ids', None)
-        for rec in self:
-            if rec._db_sync_enabled():
-                config = rec._get_external_config()
-                url = config['url']
-                db = config['db']
-                uid = config['uid']
-                password = config['password']
-                try:
-                    _logger.info(f"Connecting to external server at {url} for write operation")
-                    models_rpc = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/object')
-                except Exception as e:
-                    raise ValidationError(f"Failed to connect to external server: {e}")
-                res = super(ProductTemplate, self).write(vals)
-                # handle case when vendors are added in product template
-                copied_vals = deepcopy(vals)
-                if copied_vals.get('seller_ids', False):
-                    for i, seller_data in enumerate(copied_vals['seller_ids']):
-                        _logger.info(f"Processing seller_data: {seller_data}")
-                        # Handle case when vendors are being added newly
-                        if len(seller_data) > 2 and seller_data[0] == 0 and isinstance(seller_data[2], dict):
-                            partner_id = seller_data[2].get('partner_id', False)
-                            if partner_id:
-                                partner = self.env['res.partner'].browse(partner_id)
-                                if partner.related_partner_id:
-                                    copied_vals['seller_ids'][i][2]['partner_id'] = partner.related_partner_id
-                        # Handle case when vendor line is being edited
-                        elif len(seller_data) > 2 and seller_data[0] == 1 and isinstance(seller_data[2], dict):
-                            main_db_supplier_info_id = seller_data[1]
-                            main_supplier_info = self.env['product.supplierinfo'].browse(main_db_supplier_info_id)
-                            main_supplier_tmpl_id = main_supplier_info.product_tmpl_id.id
-                            main_supplier_related_partner_id = main_supplier_info.partner_id.id
-                            if main_supplier_tmpl_id and main_supplier_related_partner_id:
-                                related_product_id = self.env['product.template'].browse(main_supplier_tmpl_id).related_product_id
-                                related_partner_id = self.env['res.partner'].browse(main_supplier_related_partner_id).related_partner_id
-                                if related_product_id and related_partner_id:
-                                    remote_supplier_info_ids = models_rpc.execute_kw(
-                                        db, uid, password, 'product.supplierinfo', 'search',
-                                        [[['product_tmpl_id', '=', related_product_id],
-                                          ['partner_id', '=', related_partner_id]]]
-                                    )
-                                    if remote_supplier_info_ids:
-                                        copied_vals['seller_ids'][i][1] = remote_supplier_info_ids[0]
-                                    else:
-                                        raise ValidationError(f"Related supplier info not found in remote DB for product_tmpl_id {related_product_id} and partner_id {related_partner_id}")
-                                else:
-                                    raise ValidationError("Related product or partner ID not found for supplier info update.")
-                        else:
-                            copied_vals.pop('seller_ids', None)
-                # Handle product packing record edit.
-                if copied_vals.get('packaging_ids', False):
-                    for packaging in copied_vals.get('packaging_ids', []):
-                        # Handle Case when editing existing packaging line
-                        if len(packaging) > 2 and packaging[0] == 1 and isinstance(packaging[2], dict):
-                            main_db_packaging_id = packaging[1]
-                            main_packaging = self.env['product.packaging'].browse(main_db_packaging_id)
-                            product_id = main_packaging.product_id
-                            qty = main_packaging.qty
-                            remote_product_id = product_id.remote_product_id
-                            if remote_product_id and qty:
-                                remote_packaging_id = models_rpc.execute_kw(
-                                    db, uid, password, 'product.packaging', 'search',
-                                    [[['product_id', '=', remote_product_id],
-                                      ['qty', '=', qty]]], {'limit': 1}
-                                )
-                                if remote_packaging_id:
-                                    packaging[1] = remote_packaging_id
-                                else:
-                                    raise ValidationError(f"Related packaging not found in remote DB for product_id {remote_product_id} and qty {qty}")
-                # Handle case when product attribute and variants feature is enabled
-                if copied_vals.get('attribute_line_ids', False):
-                    for i, attr_data in enumerate(copied_vals['attribute_line_ids']):
-                        # Handle case when attribute lines are being added newly
-                        if len(attr_data) > 2 and attr_data[0] == 0 and isinstance(attr_data[2], dict):
-                            for value_id in attr_data[2].get('value_ids', []):
-                                main_db_value_id = value_id[1] if len(value_id) > 1 else None
-                                if main_db_value_id:
-                                    main_value = self.env['product.attribute.value'].browse(main_db_value_id)
-                                    # search on remote db by main_value.name in 'product.attribute.value' model with limit = 1
-                                    remote_value_id = models_rpc.execute_kw(
-                                        db, uid, password, 'product.attribute.value', 'search',
-                                        [[['name', '=', main_value.name]]], {'limit': 1}
-                                    )
-                                    value_id[1] = remote_value_id[0] if remote_value_id else None
-                            # map attribute_id with remote attribute_id
-                            attribute_id = attr_data[2].get('attribute_id', False)
-                            if attribute_id:
-                                attribute = self.env['product.attribute'].browse(attribute_id)
-                                if attribute.remote_attribute_id:
-                                    copied_vals['attribute_line_ids'][i][2]['attribute_id'] = attribute.remote_attribute_id
-                        # Handle cases when line are being edited
-                        if len(attr_data) > 2 and attr_data[0] == 1 and isinstance(attr_data[2], dict):
-                            ptal = self.env['product.template.attribute.line'].browse(attr_data[1])
-                            remote_product_tmpl_id = ptal.product_tmpl_id.related_product_id
-                            remote_attribute_id = ptal.attribute_id.remote_attribute_id
-                            if remote_product_tmpl_id and remote_attribute_id:
-                                remote_ptal_id = models_rpc.execute_kw(
-                                    db, uid, password, 'product.template.attribute.line', 'search',
-                                    [[['product_tmpl_id', '=', remote_product_tmpl_id],
-                                      ['attribute_id', '=', remote_attribute_id]]]
-                                )
-                                if remote_ptal_id:
-                                    attr_data[1] = remote_ptal_id
-                            for value_id in attr_data[2].get('value_ids', []):
-                                main_db_value_id = value_id[1] if len(value_id) > 1 else None
-                                if main_db_value_id:
-                                    main_value = self.env['product.attribute.value'].browse(main_db_value_id)
-                                    # search on remote db by main_value.name in 'product.attribute.value' model with limit = 1
-                                    remote_value_id = models_rpc.execute_kw(
-                                        db, uid, password, 'product.attribute.value', 'search',
-                                        [[['name', '=', main_value.name]]], {'limit': 1}
-                                    )
-                                    value_id[1] = remote_value_id[0] if remote_value_id else None
-                if copied_vals.get('property_account_income_id', False):
-                    account_id = copied_vals['property_account_income_id']
-                    account = self.env['account.account'].browse(account_id)
-                    if account.remote_account_id:
-                        copied_vals['property_account_income_id'] = account.remote_account_id
-                if copied_vals.get('property_account_expense_id', False):
-                    account_id = copied_vals['property_account_expense_id']
-                    account = self.env['account.account'].browse(account_id)
-                    if account.remote_account_id:
-                        copied_vals['property_account_expense_id'] = account.remote_account_id
-                if copied_vals.get('categ_id', False):
-                    category_id = copied_vals['categ_id']
-                    category = self.env['product.category'].browse(category_id)
-                    if category.remote_category_id:
-                        copied_vals['categ_id'] = category.remote_category_id
-                if copied_vals.get('product_variant_ids', False):
-                    copied_vals.pop('product_variant_ids', None)
-                models_rpc.execute_kw(db, uid, password, 'product.template', 'write',
-                                      [[rec.related_product_id], copied_vals])
-                logging.info(f"Updated remote product.template ID {rec.related_product_id} with vals: {copied_vals}")
-                return res
+        res = super().write(vals)
+        if 'categ_id' in vals:
+            # the product may move in or out of the own products
+            self.env['customer.commission.queue'].sudo()._enqueue(
+                self.env['customer.commission.ledger'].sudo()._get_product_keys(
+                    self.with_context(active_test=False).product_variant_ids.ids))
+        return res
+
+    def _sync_transform_prices(self, vals_list, transform):
+        return transform.product_prices(vals_list)
+
+    def _sync_reconcile(self, remote_models):
+        result = super()._sync_reconcile(remote_models)
+        linked = self.filtered('related_product_id')
+        # the variants are created remotely along with their template, link them
+        # to the remote variant with the same combination of attribute values
+        linked.product_variant_ids.filtered(lambda variant: not variant.remote_product_id)._sync_reconcile(
+            remote_models)
+        # vendor prices wait for their product to be linked, see ProductSupplierinfo
+        linked.seller_ids.filtered(lambda seller: not seller.remote_supplierinfo_id)._sync_reconcile(remote_models)
+        return result
+
+    def _sync_translate_attribute_lines(self, value, remote_models):
+        """Attribute lines of the created products, or line commands of a write.
+        Attributes and values not linked yet are linked or created remotely,
+        deleted lines are handled by ProductTemplateAttributeLine.unlink()."""
+        config = self._get_external_config()
+        if isinstance(value, models.BaseModel):
+            remote_attribute_ids = value.attribute_id._get_remote_attribute_ids(remote_models)
+            remote_value_ids = value.value_ids._get_remote_value_ids(remote_models, config, create_missing=True)
+            return [(0, 0, {
+                'attribute_id': remote_attribute_ids.get(line.attribute_id.id, False),
+                'value_ids': [(6, 0, [remote_value_ids[attr_value.id] for attr_value in line.value_ids
+                                      if attr_value.id in remote_value_ids])],
+            }) for line in value]
+        line_commands = [command for command in value
+                         if command[0] in (0, 1) and len(command) > 2 and isinstance(command[2], dict)]
+        remote_attribute_ids = self.env['product.attribute'].browse([
+            command[2]['attribute_id'] for command in line_commands if command[2].get('attribute_id')
+        ])._get_remote_attribute_ids(remote_models)
+        remote_value_ids = self.env['product.attribute.value'].browse([
+            value_id for command in line_commands for value_id in _m2m_ids(command[2].get('value_ids'))
+        ])._get_remote_value_ids(remote_models, config, create_missing=True)
+        commands = []
+        for command in line_commands:
+            line_vals = dict(command[2])
+            if 'value_ids' in line_vals:
+                line_vals['value_ids'] = _translate_m2m(line_vals['value_ids'], remote_value_ids)
+            if command[0] == 0:
+                if line_vals.get('attribute_id'):
+                    line_vals['attribute_id'] = remote_attribute_ids.get(line_vals['attribute_id'], False)
+                commands.append((0, 0, line_vals))
+                continue
+            line_vals.pop('attribute_id', None)
+            line = self.env['product.template.attribute.line'].browse(command[1])
+            remote_line_ids = remote_models.execute_kw(
+                config['db'], config['uid'], config['password'], 'product.template.attribute.line', 'search',
+                [[['product_tmpl_id', '=', line.product_tmpl_id.related_product_id],
+                  ['attribute_id', '=', line.attribute_id.remote_attribute_id]]], {'limit': 1}
+            ) if line.product_tmpl_id.related_product_id and line.attribute_id.remote_attribute_id else []
+            if remote_line_ids:
+                commands.append((1, remote_line_ids[0], line_vals))
             else:
-                _logger.info(vals)
-                _logger.info("Data sync not enabled or no related_product_id; skipping external DB operation.")
-                return super(ProductTemplate, self).write(vals)
-
-    def unlink(self):
-        """Override unlink to delete the product.template in external DB as well"""
-        if self._db_sync_enabled():
-            config = self._get_external_config()
-            url = config['url']
-            db = config['db']
-            uid = config['uid']
-            password = config['password']
-            models_rpc = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/object')
-            for record in self:
-
-                if record.related_product_id:
-                    try:
-                        models_rpc.execute_kw(db, uid, password, 'product.template', 'unlink',
-                                              [[record.related_product_id]])
-                    except Exception as e:
-                        pass
-        return super().unlink()
+                _logger.info(f"Attribute line {line.id} not found in the remote database, not synchronized")
+        return commands or None
+
+    def _sync_translate_packagings(self, value, remote_models):
+        """Packagings of a write, the edited packagings are found remotely by
+        product and quantity. Packagings of created products are not sent."""
+        if isinstance(value, models.BaseModel):
+            return None
+        commands = []
+        for command in value:
+            if command[0] == 0 and isinstance(command[2], dict):
+                packaging_vals = dict(command[2])
+                if packaging_vals.get('product_id'):
+                    packaging_vals['product_id'] = self.env['product.product'].browse(
+                        packaging_vals['product_id']).remote_product_id or False
+                commands.append((0, 0, packaging_vals))
+            elif command[0] == 1 and isinstance(command[2], dict):
+                packaging = self.env['product.packaging'].browse(command[1])
+                remote_product_id = packaging.product_id.remote_product_id
+                remote_packaging_id = remote_product_id and packaging.qty and self._remote_lookup(
+                    'product.packaging', [['product_id', '=', remote_product_id], ['qty', '=', packaging.qty]],
+                    remote_models)
+                if remote_packaging_id:
+                    commands.append((1, remote_packaging_id, command[2]))
+                else:
+                    _logger.info(f"Packaging {packaging.id} not found in the remote database, not synchronized")
+        return commands or None
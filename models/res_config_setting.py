@@ -1,9 +1,8 @@
 from odoo import models, fields
-import xmlrpc.client
 
 
 class ResConfigSettings(models.TransientModel):
-    _inherit = 'res.config.settings'
+    _inherit = ['res.config.settings', 'db.sync.mixin']
 
     external_server_url = fields.Char(
         string='External Server URL',
@@ -25,16 +24,29 @@ class ResConfigSettings(models.TransientModel):
         string='External Server Password',
         config_parameter='purchase_commission.external_server_password'
     )
+    external_server_timeout = fields.Integer(
+        string='External Server Timeout',
+        config_parameter='purchase_commission.external_server_timeout',
+        default=30,
+        help='Timeout in seconds of the requests sent to the external server'
+    )
     data_sync = fields.Boolean(
         string='Data Sync',
         config_parameter='purchase_commission.data_sync',
         default=False
     )
+    pull_sync = fields.Boolean(
+        string='Pull Remote Changes',
+        config_parameter='purchase_commission.pull_sync',
+        default=False,
+        help='Periodically apply the changes made in the external database to the linked records'
+    )
 
     sale_decreased_percentage = fields.Float(
         string='Sale Decreased Percentage',
         config_parameter='purchase_commission.sale_decreased_percentage',
-        default=0.0
+        default=0.0,
+        help='Decrease applied to the product and pricelist prices mirrored to the external database'
     )
 
     sale_sync = fields.Boolean(
@@ -52,28 +64,19 @@ class ResConfigSettings(models.TransientModel):
     transaction_decrease_percentage = fields.Float(
         string='Transaction Decrease Percentage',
         config_parameter='purchase_commission.trxn_decrease_percentage',
-        default=0.0
+        default=0.0,
+        help='Decrease applied to the sale order line prices mirrored to the external database when Sale Sync is enabled'
     )
 
-    def _get_external_config(self):
-        ICP = self.env['ir.config_parameter'].sudo()
-        return {
-            'url': ICP.get_param('purchase_commission.external_server_url', ''),
-            'db': ICP.get_param('purchase_commission.external_server_db', ''),
-            'uid': int(ICP.get_param('purchase_commission.external_server_uid', 0)),
-            'password': ICP.get_param('purchase_commission.external_server_password', ''),
-            'user_name': ICP.get_param('purchase_commission.external_server_user_name', '')
-        }
-
-    def _db_sync_enabled(self):
-        # if data_sync is true return true else false
-        ICP = self.env['ir.config_parameter'].sudo()
-        return ICP.get_param('purchase_commission.data_sync', 'False') == 'True'
+    def set_values(self):
+        super().set_values()
+        # remote IDs cached for the previous server are meaningless now
+        self._remote_lookup_invalidate()
 
     def test_connection(self):
         config = self._get_external_config()
         try:
-            common = xmlrpc.client.ServerProxy(f"{config['url']}/xmlrpc/2/common")
+            common = self._get_remote_models('common')
             uid = common.authenticate(config['db'], config['user_name'], config['password'], {})
             if uid:
                 return {
@@ -1,15 +1,13 @@
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError
 import re
-import xmlrpc.client
 import logging
 _logger = logging.getLogger(__name__)
-from copy import deepcopy
 from odoo.osv import expression
 
 
 class ResPartner(models.Model):
-    _inherit = 'res.partner'
+    _inherit = ['res.partner', 'db.sync.mixin']
 
     # company_type is only an interface field, do not use it in business logic
     partner_type = fields.Selection(string='Company Type',
@@ -21,6 +19,21 @@ class ResPartner(models.Model):
     related_partner_id = fields.Integer(string='Related Partner ID')
 
     commission_count = fields.Integer(compute='_compute_commission_count', string='Commission Count')
+
+    # partners are synchronized when they have a mobile number
+    _sync_remote_id_field = 'related_partner_id'
+    _sync_key_fields = ('name', 'mobile')
+    _sync_fields = ('name', 'mobile', 'phone', 'email', 'street', 'street2', 'city', 'zip', 'is_company',
+                    'partner_type', 'parent_id')
+    _sync_pull_fields = ('name', 'mobile', 'phone', 'email', 'street', 'street2', 'city', 'zip')
+
+    def _sync_reconcile_domain(self):
+        return [('mobile', '!=', False)]
+
+    def _sync_reconcile_waves(self):
+        # companies are created before their contacts
+        children = self.filtered(lambda partner: partner.parent_id in self)
+        return [self - children, children]
     # mobile = fields.Char(string='Mobile', help='Mobile number in format +880 XXXX-XXXXXX')
 
     def _compute_commission_count(self):
@@ -70,19 +83,6 @@ class ResPartner(models.Model):
             return '+880 ' + mobile[4:8] + '-' + mobile[8:]
         return mobile
 
-    def _get_external_config(self):
-        ICP = self.env['ir.config_parameter'].sudo()
-        return {
-            'url': ICP.get_param('purchase_commission.external_server_url', ''),
-            'db': ICP.get_param('purchase_commission.external_server_db', ''),
-            'password': ICP.get_param('purchase_commission.external_server_password', '')
-        }
-
-    def _db_sync_enabled(self):
-        # if data_sync is true return true else false
-        ICP = self.env['ir.config_parameter'].sudo()
-        return ICP.get_param('purchase_commission.data_sync', 'False') == 'True'
-
     @api.model
     def create(self, vals_list):
         """Handle both single and multiple record creation during import"""
@@ -100,84 +100,15 @@ class ResPartner(models.Model):
                 elif partner['partner_type'] == 'supplier':
                     partner['supplier_rank'] = 1
                     partner['customer_rank'] = 0
-        if self._db_sync_enabled():
-            _logger.warning('Data sync is enabled, attempting to sync partners to external DB')
-            config = self._get_external_config()
-            url = config['url']
-            db = config['db']
-            uid = config['uid']
-            password = config['password']
-            try:
-                remote_models = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/object')
-                # create record in remote database
-                for vals in vals_list:
-                    # remove key avalara_partner_code and avalara_exemption_id if exists
-                    if vals.get('mobile'):
-                        vals['mobile'] = self._format_mobile_number(vals['mobile'])
-                        # when user with same name and mobile already available in remote db, do nothing
-                        try:
-                            existing_records = remote_models.execute_kw(db, uid, password, 'res.partner', 'search',
-                                                                        [[['name', '=', vals.get('name')],
-                                                                          ['mobile', '=', vals.get('mobile')]]])
-                            # If no existing record found, create a new one in the remote DB
-                            if not existing_records:
-                                # Need to handle case when a company has many child contatc
-                                if vals.get('child_ids', False):
-                                    child_ids = deepcopy(vals['child_ids'])
-                                    # remove child_ids before creating company record
-                                    vals.pop('child_ids')
-                                    # create company record in remote db
-                                    remote_record_id = remote_models.execute_kw(db, uid, password, 'res.partner',
-                                                                                'create', [vals])
-                                    # revert child_ids info on vals
-                                    vals['child_ids'] = child_ids
-                                    # create child record in remote database
-                                    for child in child_ids:
-                                        child[2]['parent_id'] = remote_record_id
-                                        remote_models.execute_kw(db, uid, password, 'res.partner', 'create', [child[2]])
-                                else:
-                                    remote_models.execute_kw(db, uid, password, 'res.partner', 'create', [vals])
-                                _logger.info(f'Created remote partner for {vals.get("name")}')
-                        except Exception as e:
-                            _logger.error(f'Error during remote partner creation: {e}')
-                # create record in main database
-                new_partners = super(ResPartner, self).create(vals_list)
-                # map new partners with remote records
-                for partner in new_partners:
-                    if not partner.related_partner_id:
-                        # find related record id from remote db
-                        try:
-                            remote_record = remote_models.execute_kw(db, uid, password, 'res.partner', 'search',
-                                                                     [[['name', '=', partner.name],
-                                                                       ['mobile', '=', partner.mobile]]], {'limit': 1})
-                            # write related partner id from main  database to remote record
-                            remote_models.execute_kw(db, uid, password, 'res.partner', 'write',
-                                                     [remote_record, {'related_partner_id': partner.id}])
-                            # write related partner id from remote database to main record
-                            partner.write({'related_partner_id': remote_record[0] if remote_record else False})
-
-                        except Exception as e:
-                            _logger.error(f'Error mapping related_partner_id: {e}')
-                return new_partners
-            except Exception as e:
-                _logger.error(f'Error connecting to external DB: {e}')
-        else:
-            _logger.warning('Data sync is disabled, proceeding without sync')
-            return super(ResPartner, self).create(vals_list)
+        for vals in vals_list:
+            if vals.get('mobile'):
+                vals['mobile'] = self._format_mobile_number(vals['mobile'])
+        return super(ResPartner, self).create(vals_list)
 
     def write(self, vals):
         """Format mobile number during updates"""
-        for rec in self:
-            if vals.get('mobile'):
-                vals['mobile'] = rec._format_mobile_number(vals['mobile'])
-            if rec._db_sync_enabled():
-                config = rec._get_external_config()
-                url = config['url']
-                db = config['db']
-                uid = config['uid']
-                password = config['password']
-                res_models = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/object')
-                res_models.execute_kw(db, uid, password, 'res.partner', 'write', [[rec.related_partner_id], vals])
+        if vals.get('mobile'):
+            vals['mobile'] = self._format_mobile_number(vals['mobile'])
         return super(ResPartner, self).write(vals)
 
     @api.constrains('mobile', 'name')
@@ -230,26 +161,6 @@ class ResPartner(models.Model):
                 if existing_partners:
                     raise ValidationError("A partner with the same email address already exists.")
 
-    def unlink(self):
-        """Override unlink to delete the partner in external DB as well"""
-        if self._db_sync_enabled():
-            config = self._get_external_config()
-            url = config['url']
-            db = config['db']
-            uid = config['uid']
-            password = config['password']
-            models_rpc = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/object')
-
-            for partner in self:
-                if partner.related_partner_id:
-                    try:
-                        models_rpc.execute_kw(db, uid, password, 'res.partner', 'unlink',
-                                              [[partner.related_partner_id]])
-                    except Exception:
-                        pass
-
-        return super().unlink()
-
     @api.model
     def name_search(self, name='', args=None, operator='ilike', limit=100):
         args = args or []
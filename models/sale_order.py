@@ -1,14 +1,15 @@
 from odoo import models, api, fields, _
 from odoo.tools.misc import format_amount
+from collections import defaultdict
 import re
-import xmlrpc.client
 import logging
 _logger = logging.getLogger(__name__)
-from copy import deepcopy
+
+from odoo.addons.purchase_commission.utils.price_transform import command_vals
 
 
 class SaleOrder(models.Model):
-    _inherit = 'sale.order'
+    _inherit = ['sale.order', 'db.sync.mixin']
 
     order_method = fields.Selection([
         ('onsite', 'On Site'),
@@ -16,6 +17,147 @@ class SaleOrder(models.Model):
     ], string='Order Method', default='onsite')
     remote_sale_order_id = fields.Integer(string='Remote Sale Order ID')
 
+    _sync_remote_id_field = 'remote_sale_order_id'
+    _sync_fields = ('partner_id', 'pricelist_id', 'date_order', 'client_order_ref', 'order_method', 'order_line')
+    _sync_translators = {'order_line': '_sync_translate_order_lines'}
+
+    def _sync_translate_vals(self, vals, remote_models):
+        remote_vals = super()._sync_translate_vals(vals, remote_models)
+        if 'partner_id' in remote_vals:
+            # remote orders are invoiced to their customer
+            remote_vals['partner_invoice_id'] = remote_vals['partner_id']
+        return remote_vals
+
+    def _sync_translate_order_lines(self, value, remote_models):
+        """Lines of the created orders, or line commands of a write. Lines not
+        linked yet are left out of the updates, deleted lines are handled by
+        SaleOrderLine.unlink()."""
+        if isinstance(value, models.BaseModel):
+            commands = []
+            for line in value:
+                line_vals = {'name': line.name, 'sequence': line.sequence, 'display_type': line.display_type or False}
+                if not line.display_type:
+                    line_vals.update({
+                        'product_id': line.product_id.id,
+                        'product_uom_qty': line.product_uom_qty,
+                        'price_unit': line.price_unit,
+                        'product_packaging_id': line.product_packaging_id.id,
+                    })
+                commands.append((0, 0, self._sync_translate_line_vals(line_vals, remote_models)))
+            return commands
+        commands = []
+        for command in value:
+            if command[0] == 0:
+                commands.append((0, 0, self._sync_translate_line_vals(command[2], remote_models)))
+            elif command[0] == 1:
+                remote_line_id = self.env['sale.order.line'].browse(command[1]).remote_sale_order_line_id
+                if remote_line_id:
+                    commands.append((1, remote_line_id, self._sync_translate_line_vals(command[2], remote_models)))
+        return commands or None
+
+    def _sync_translate_line_vals(self, line_vals, remote_models):
+        line_vals = dict(line_vals)
+        line_vals.pop('remote_sale_order_line_id', None)
+        if line_vals.get('product_template_id'):
+            line_vals['product_template_id'] = self.env['product.template'].browse(
+                line_vals['product_template_id']).related_product_id or False
+        if line_vals.get('product_id'):
+            line_vals['product_id'] = self.env['product.product'].browse(
+                line_vals['product_id']).remote_product_id or False
+        if line_vals.get('product_packaging_id'):
+            packaging = self.env['product.packaging'].browse(line_vals['product_packaging_id'])
+            line_vals['product_packaging_id'] = packaging.product_id.remote_product_id and self._remote_lookup(
+                'product.packaging', [['product_id', '=', packaging.product_id.remote_product_id],
+                                      ['qty', '=', packaging.qty]], remote_models)
+        elif 'product_packaging_id' in line_vals:
+            line_vals['product_packaging_id'] = False
+        return line_vals
+
+    def _sync_transform_prices(self, vals_list, transform):
+        transform.transaction_prices([line_vals for vals in vals_list
+                                      for line_vals in command_vals(vals.get('order_line'))])
+        return vals_list
+
+    def _sync_prepare_push_vals(self, remote_models):
+        vals = self._sync_prepare_reconcile_vals(remote_models)
+        if self.state in ('draft', 'sent'):
+            # the remote lines of a quotation are replaced
+            vals['order_line'] = [(5, 0, 0)] + vals['order_line']
+        else:
+            # the lines of a confirmed order cannot be deleted
+            vals.pop('order_line')
+        return vals
+
+    def _sync_reconcile(self, remote_models):
+        """Orders have no key shared by both databases, the remote orders of
+        self are found by their backlink and the missing ones are created"""
+        config = self._get_external_config()
+        remote_orders = remote_models.execute_kw(
+            config['db'], config['uid'], config['password'], 'sale.order', 'search_read',
+            [[['remote_sale_order_id', 'in', self.ids]]], {'fields': ['remote_sale_order_id']})
+        found = {row['remote_sale_order_id']: row['id'] for row in remote_orders}
+        to_link = self.filtered(lambda order: order.id in found)
+        to_link._sync_link([found[order.id] for order in to_link])
+        to_create = self - to_link
+        to_create._sync_create_remote(remote_models)
+        # the orders and their lines in one call, then the remote line IDs in one search_read
+        self._sync_link_lines(remote_models)
+        return len(to_link), len(to_create)
+
+    def _sync_create_remote(self, remote_models):
+        """Create the orders of self and their lines remotely with a single
+        list-form create carrying the backlinks"""
+        if not self:
+            return
+        config = self._get_external_config()
+        vals_list = []
+        for order in self:
+            vals = order._sync_prepare_reconcile_vals(remote_models)
+            vals['remote_sale_order_id'] = order.id
+            vals_list.append(vals)
+        self._sync_transform_prices(vals_list, self._sync_price_transform())
+        self._sync_link(remote_models.execute_kw(config['db'], config['uid'], config['password'],
+                                                 'sale.order', 'create', [vals_list]))
+
+    def _sync_push(self, remote_models):
+        super()._sync_push(remote_models)
+        self._sync_link_lines(remote_models)
+
+    def _sync_link_lines(self, remote_models):
+        """Link the lines of the linked orders of self that have no remote line
+        yet to the remote lines no local line is linked to, in sequence order,
+        with a single search_read for all the orders"""
+        config = self._get_external_config()
+        orders = self.filtered('remote_sale_order_id')
+        if not orders:
+            return
+        remote_lines = defaultdict(list)
+        for row in remote_models.execute_kw(
+                config['db'], config['uid'], config['password'], 'sale.order.line', 'search_read',
+                [[['order_id', 'in', orders.mapped('remote_sale_order_id')]]],
+                {'fields': ['order_id'], 'order': 'sequence, id'}):
+            remote_lines[row['order_id'][0]].append(row['id'])
+        lines, remote_ids = self.env['sale.order.line'], []
+        for order in orders:
+            order_remote_ids = remote_lines[order.remote_sale_order_id]
+            linked_ids = set(order.order_line.mapped('remote_sale_order_line_id')) & set(order_remote_ids)
+            to_link = order.order_line.filtered(lambda line: line.remote_sale_order_line_id not in linked_ids)
+            free_ids = [remote_id for remote_id in order_remote_ids if remote_id not in linked_ids]
+            for line, remote_id in zip(to_link.sorted(lambda line: (line.sequence, line.id)), free_ids):
+                line.with_context(db_sync_skip=True).write({'remote_sale_order_line_id': remote_id})
+                lines |= line
+                remote_ids.append(remote_id)
+        lines._sync_map(remote_ids)
+
+    def _sync_written(self, vals, remote_models):
+        if 'order_line' in vals:
+            self._sync_link_lines(remote_models)
+
+    def _sync_on_error(self, records, error):
+        # a cached packaging may have been deleted remotely
+        self._remote_lookup_invalidate('product.packaging')
+        return super()._sync_on_error(records, error)
+
     def _report_paginated_lines(self, first_page_count=22, other_page_count=30):
         self.ensure_one()
 
@@ -138,191 +280,54 @@ class SaleOrder(models.Model):
                     }
                 }
 
-    def _get_external_config(self):
-        ICP = self.env['ir.config_parameter'].sudo()
-        return {
-            'url': ICP.get_param('purchase_commission.external_server_url', ''),
-            'db': ICP.get_param('purchase_commission.external_server_db', ''),
-            'uid': int(ICP.get_param('purchase_commission.external_server_uid', 0)),
-            'password': ICP.get_param('purchase_commission.external_server_password', '')
-        }
-
-    def _db_sync_enabled(self):
-        # if data_sync is true return true else false
-        ICP = self.env['ir.config_parameter'].sudo()
-        return ICP.get_param('purchase_commission.data_sync', 'False') == 'True'
-
-    @api.model
-    def create(self, vals_list):
-        """Handle both single and multiple record creation during import"""
-        # Ensure vals_list is always a list for consistency
-        _logger.info(f'Creating partners with vals: {vals_list}')
-        single_record = isinstance(vals_list, dict)
-        if single_record:
-            vals_list = [vals_list]
-
-        if self._db_sync_enabled():
-            _logger.warning('Data sync is enabled, attempting to sync partners to external DB')
-            config = self._get_external_config()
-            url = config['url']
-            db = config['db']
-            uid = config['uid']
-            password = config['password']
-            try:
-                remote_models = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/object')
-                # create record in remote database
-                for vals in vals_list:
-                    copied_vals = deepcopy(vals)
-                    # update vals to match remote db
-                    if copied_vals.get('partner_id', False):
-                        main_db_partner = self.env['res.partner'].browse(vals['partner_id'])
-                        copied_vals['partner_id'] = main_db_partner.related_partner_id
-                        copied_vals['partner_invoice_id'] = main_db_partner.related_partner_id
-                    # Handle case when sale order line is added at the time of sale order creation
-                    if copied_vals.get('order_line', False):
-                        for line in copied_vals['order_line']:
-                            # product template is to replaced by remote product tempate
-                            line[2]['product_template_id'] = self.env['product.template'].browse(
-                                line[2]['product_template_id']).related_product_id
-                            # product is to be replaced by remote product
-                            if line[2].get('product_id', False):
-                                line[2]["product_id"] = self.env['product.product'].search([('id', '=', line[2]['product_id'])]).remote_product_id
-                            # Handle case when product packaging is set
-                            if line[2].get('product_packaging_id', False):
-                                main_db_packaging_id = self.env['product.packaging'].browse(
-                                    line[2]['product_packaging_id'])
-                                remote_product_id = main_db_packaging_id.product_id.remote_product_id
-                                qty = main_db_packaging_id.qty
-                                remote_packaging_id = remote_models.execute_kw(db, uid, password, 'product.packaging',
-                                                                               'search', [[['product_id', '=',
-                                                                                            remote_product_id],
-                                                                                           ['qty', '=', qty]]],
-                                                                               {'limit': 1})
-                                line[2]['product_packaging_id'] = remote_packaging_id[
-                                    0] if remote_packaging_id else False
-                    # TODO: need to handle this case of pricelist
-                    if copied_vals.get('pricelist_id', False):
-                        main_db_pricelist_id = self.env['product.pricelist'].browse(copied_vals['pricelist_id'])
-                        remote_db_pricelist_id = main_db_pricelist_id.remote_pricelist_id
-                        copied_vals['pricelist_id'] = remote_db_pricelist_id if remote_db_pricelist_id else False
-
-                    # create record in remote database with above prepared copied_vals
-                    remote_id = remote_models.execute_kw(db, uid, password, 'sale.order', 'create', [copied_vals])
-
-                    # list sale order line ids from remote db for setting remote_sale_order_line_id in main db
-                    remote_sale_order_line_ids = remote_models.execute_kw(db, uid, password, 'sale.order.line',
-                                                                          'search', [[['order_id', '=', remote_id]]])
-                    # in main db we have to set remote_sale_order_line_id for each sale order line
-                    for rsol, msol in zip(remote_sale_order_line_ids, vals['order_line']):
-                        msol[2]['remote_sale_order_line_id'] = rsol
-                    # set remote_sale_order_id in main db vals
-                    vals['remote_sale_order_id'] = remote_id
-                # create record in main db
-                new_sale_orders = super().create(vals_list)
-                # after creating record in main db search the record in remote db with partner_id and date_order and set remote_sale_order_id in remote db
-                for sale_order in new_sale_orders:
-                    main_db_partner_id = sale_order.partner_id
-                    remote_db_partner_id = main_db_partner_id.related_partner_id
-                    quotation_date = sale_order.date_order
-                    remote_sale_order_id = remote_models.execute_kw(db, uid, password, 'sale.order', 'search', [[['partner_id', '=', remote_db_partner_id], ['date_order', '=', quotation_date]]], {'limit': 1})
-                    remote_models.execute_kw(db, uid, password, 'sale.order', 'write', [[remote_sale_order_id[0]], {'remote_sale_order_id': sale_order.id}])
-                    return new_sale_orders
-            except Exception as e:
-                _logger.error(f'Failed to connect to external server: {e}')
-                return super().create(vals_list)
-        else:
-            return super().create(vals_list)
+    def _update_commission_ledger(self, sign=1):
+        """Add (or remove, with sign=-1) the amounts of confirmed orders to the commission ledger."""
+        entries = []
+        for order in self:
+            own_product_lines = order.order_line.filtered(lambda line: line.product_id.is_own_product)
+            entries.append((order.partner_id, order.company_id, order.date_order.date(), {
+                'total_purchase': sign * order.amount_total,
+                'total_own_product_purchase': sign * sum(own_product_lines.mapped('price_total')),
+            }))
+        self.env['customer.commission.ledger'].sudo()._add_entries(entries)
+
+    def action_confirm(self):
+        res = super().action_confirm()
+        self.filtered(lambda order: order.state == 'sale')._update_commission_ledger()
+        return res
+
+    def _action_cancel(self):
+        confirmed = self.filtered(lambda order: order.state == 'sale')
+        res = super()._action_cancel()
+        # once cancelled, the orders are left out of the totals seeding a missing ledger row
+        confirmed.filtered(lambda order: order.state != 'sale')._update_commission_ledger(sign=-1)
+        return res
+
+    def _get_commission_keys(self):
+        """(partner_id, fiscal_year_id, company_id) of the commissions the confirmed orders contribute to."""
+        Ledger = self.env['customer.commission.ledger'].sudo()
+        keys = set()
+        for order in self.filtered(lambda order: order.state == 'sale' and order.partner_id and order.date_order):
+            fiscal_year = Ledger._get_fiscal_year(order.company_id, order.date_order.date())
+            if fiscal_year:
+                keys.add((order.partner_id.id, fiscal_year.id, order.company_id.id))
+        return keys
 
     def write(self, vals):
-        if self._db_sync_enabled():
-            _logger.warning('Data sync is enabled, attempting to sync partners to external DB')
-            config = self._get_external_config()
-            url = config['url']
-            db = config['db']
-            uid = config['uid']
-            password = config['password']
-            try:
-                remote_models = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/object')
-                for order in self:
-                    if not order.remote_sale_order_id:
-                        _logger.info(f'Skipping sync for Sale Order {order.name} as it has no remote ID')
-                        continue
-                    update_vals = deepcopy(vals)
-                    # update vals to match remote db
-                    if update_vals.get('partner_id', False):
-                        main_db_partner = self.env['res.partner'].browse(vals['partner_id'])
-                        update_vals['partner_id'] = main_db_partner.related_partner_id
-                        update_vals['partner_invoice_id'] = main_db_partner.related_partner_id
-                    # Handle case when sale order line is added/updated at the time of sale order updation
-                    if update_vals.get('order_line', False):
-                        for line in update_vals['order_line']:
-                            # Handle case when adding new sale order line
-                            if line[0] == 0:
-                                if line[2].get('product_template_id', False):
-                                    line[2]['product_template_id'] = self.env['product.template'].browse(
-                                        line[2]['product_template_id']).related_product_id
-                                if line[2].get('product_id', False):
-                                    line[2]["product_id"] = self.env['product.product'].search(
-                                        [('id', '=', line[2]['product_id'])]).remote_product_id
-                                if line[2].get('product_packaging_id', False):
-                                    main_db_packaging_id = self.env['product.packaging'].browse(
-                                        line[2]['product_packaging_id'])
-                                    remote_product_id = main_db_packaging_id.product_id.remote_product_id
-                                    qty = main_db_packaging_id.qty
-                                    remote_packaging_id = remote_models.execute_kw(db, uid, password,'product.packaging', 'search', [[['product_id', '=', remote_product_id], ['qty', '=', qty]]],
-                                                                                   {'limit': 1})
-                                    line[2]['product_packaging_id'] = remote_packaging_id[0] if remote_packaging_id else False
-                            # Handle case when updating existing sale order line
-                            if line[0] == 1:
-                                main_db_sale_order_line_id = line[1]
-                                main_db_sale_order_line = self.env['sale.order.line'].browse(main_db_sale_order_line_id)
-                                remote_db_sale_order_line_id = main_db_sale_order_line.remote_sale_order_line_id
-                                line[1] = remote_db_sale_order_line_id if remote_db_sale_order_line_id else False
-                    # TODO : need to handle this case of pricelist
-                    if update_vals.get('pricelist_id', False):
-                        main_db_pricelist_id = self.env['product.pricelist'].browse(update_vals['pricelist_id'])
-                        remote_db_pricelist_id = main_db_pricelist_id.remote_pricelist_id
-                        update_vals['pricelist_id'] = remote_db_pricelist_id if remote_db_pricelist_id else False
-                    # with updated vals write to remote db
-                    remote_models.execute_kw(db, uid, password, 'sale.order', 'write', [[order.remote_sale_order_id], update_vals])
-                    # in main db we have to set remote_sale_order_line_id for each sale order line
-                    main_sol_ids = [sale_order_line.remote_sale_order_line_id for sale_order_line in order.order_line]
-                    remote_sol_ids = remote_models.execute_kw(db, uid, password, 'sale.order.line', 'search', [[['order_id', '=', order.remote_sale_order_id]]])
-                    remote_sol_ids = list(set(remote_sol_ids) - set(main_sol_ids))
-                    if vals.get('order_line'):
-                        for i, rid in enumerate(remote_sol_ids):
-                            if i < len(vals['order_line']) and vals['order_line'][i][2]:
-                                vals['order_line'][i][2]['remote_sale_order_line_id'] = rid
-                    return super(SaleOrder, self).write(vals)
-            except Exception as e:
-                _logger.error(f'Failed to connect to external server: {e}')
-        else:
-            _logger.info('Data sync is disabled, skipping external DB update')
-            return super(SaleOrder, self).write(vals)
-
-    def unlink(self):
-        if self._db_sync_enabled():
-            _logger.warning('Data sync is enabled, attempting to delete partners from external DB')
-            config = self._get_external_config()
-            url = config['url']
-            db = config['db']
-            uid = config['uid']
-            password = config['password']
-            try:
-                remote_models = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/object')
-                for order in self:
-                    if not order.remote_sale_order_id:
-                        _logger.info(f'Skipping sync for Sale Order {order.name} as it has no remote ID')
-                        continue
-                    remote_models.execute_kw(db, uid, password, 'sale.order', 'unlink', [[order.remote_sale_order_id]])
-                return super(SaleOrder, self).unlink()
-            except Exception as e:
-                _logger.error(f'Failed to connect to external server: {e}')
-                return super(SaleOrder, self).unlink()
-        else:
-            _logger.info('Data sync is disabled, skipping external DB deletion')
-            return super(SaleOrder, self).unlink()
-
+        if not {'partner_id', 'date_order', 'company_id'}.intersection(vals):
+            return super().write(vals)
+        # confirmed orders moved to another customer or fiscal year, enqueue the keys before and after
+        keys = self._get_commission_keys()
+        res = super().write(vals)
+        keys |= self._get_commission_keys()
+        self.env['customer.commission.queue'].sudo()._enqueue(keys)
+        return res
+
+    def _compute_amounts(self):
+        super()._compute_amounts()
+        # lines edited on confirmed orders change the amounts without a write of the order
+        self.env['customer.commission.queue'].sudo()._enqueue(
+            self.filtered('id')._get_commission_keys())
 
     def action_send_whatsapp_msg(self):
         """This function is called when the user clicks the 'Send WhatsApp Message' button on a sale order/quotation's form view. It opens a new
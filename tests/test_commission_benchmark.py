@@ -0,0 +1,144 @@
+from collections import defaultdict
+from datetime import date, datetime
+import logging
+import random
+import time
+
+from odoo.tests import TransactionCase, tagged
+_logger = logging.getLogger(__name__)
+
+BENCHMARK_YEAR = 2090
+
+
+@tagged('-standard', 'benchmark')
+class TestCommissionBenchmark(TransactionCase):
+    """Number of SQL queries and wall time of the commission engine on synthetic
+    data, logged per step. Not part of the standard tests, run it with:
+
+        odoo-bin -d <db> -u purchase_commission --test-enable --test-tags benchmark
+    """
+
+    partners = 100
+    orders = 3
+    invoices = 3
+    payments = 2
+    seed = 0
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env['ir.config_parameter'].sudo().set_param('purchase_commission.data_sync', 'False')
+
+    def _measure(self, results, name, func):
+        """Run func and record its query count and wall time under name."""
+        self.env.flush_all()
+        self.env.invalidate_all()
+        queries = self.env.cr.sql_log_count
+        start = time.perf_counter()
+        func()
+        self.env.flush_all()
+        results[name] = {
+            'queries': self.env.cr.sql_log_count - queries,
+            'seconds': round(time.perf_counter() - start, 3),
+        }
+        _logger.info("Commission benchmark %-22s %8d queries %10.3f s",
+                     name, results[name]['queries'], results[name]['seconds'])
+
+    def _generate_data(self):
+        """Create a fiscal year with partners, confirmed orders, invoices and payments.
+        Returns the created records by kind."""
+        rng = random.Random(self.seed)
+        company = self.env.company
+        fiscal_year = self.env['account.fiscal.year'].create({
+            'name': f'Commission Benchmark {BENCHMARK_YEAR}',
+            'date_from': date(BENCHMARK_YEAR, 1, 1),
+            'date_to': date(BENCHMARK_YEAR, 12, 31),
+            'company_id': company.id,
+        })
+        category = self.env['product.category'].create({'name': 'Commission Benchmark', 'own_product': True})
+        product = self.env['product.product'].create({
+            'name': 'Commission Benchmark Product',
+            'categ_id': category.id,
+            'list_price': 100.0,
+        })
+        self.env['customer.commission.config'].create([{
+            'purchase_target': target,
+            'commission_percent': percent,
+            'fiscal_year_id': fiscal_year.id,
+            'company_id': company.id,
+        } for target, percent in ((1000.0, 1.0), (5000.0, 2.0), (20000.0, 3.0))])
+        customers = self.env['res.partner'].create([
+            {'name': f'Commission Benchmark Customer {i}'} for i in range(self.partners)
+        ])
+
+        def random_date():
+            return date(BENCHMARK_YEAR, rng.randint(1, 12), rng.randint(1, 28))
+
+        sale_orders = self.env['sale.order'].create([{
+            'partner_id': customer.id,
+            'date_order': datetime.combine(random_date(), datetime.min.time()),
+            'order_line': [(0, 0, {
+                'product_id': product.id,
+                'product_uom_qty': rng.randint(1, 20),
+                'price_unit': rng.uniform(10.0, 500.0),
+            })],
+        } for customer in customers for _i in range(self.orders)])
+        moves = self.env['account.move'].create([{
+            'move_type': 'out_invoice',
+            'partner_id': customer.id,
+            'invoice_date': random_date(),
+            'invoice_line_ids': [(0, 0, {
+                'product_id': product.id,
+                'quantity': 1.0,
+                'price_unit': rng.uniform(10.0, 500.0),
+                'tax_ids': [],
+            })],
+        } for customer in customers for _i in range(self.invoices)])
+        account_payments = self.env['account.payment'].create([{
+            'payment_type': 'inbound',
+            'partner_type': 'customer',
+            'partner_id': customer.id,
+            'amount': rng.uniform(10.0, 500.0),
+            'date': random_date(),
+        } for customer in customers for _i in range(self.payments)])
+        return {
+            'fiscal_year': fiscal_year,
+            'sale_orders': sale_orders,
+            'moves': moves,
+            'payments': account_payments,
+        }
+
+    def test_commission_benchmark(self):
+        results = {}
+        Commission = self.env['customer.commission']
+        Queue = self.env['customer.commission.queue']
+        data = {}
+        self._measure(results, 'generate', lambda: data.update(self._generate_data()))
+        order_ids_by_date = defaultdict(list)
+        for order in data['sale_orders']:
+            order_ids_by_date[order.date_order].append(order.id)
+        self._measure(results, 'order confirmation', lambda: data['sale_orders'].action_confirm())
+        # the confirmation dates the orders today, move them back to the benchmark fiscal year
+        for date_order, order_ids in order_ids_by_date.items():
+            self.env['sale.order'].browse(order_ids).date_order = date_order
+        self._measure(results, 'invoice posting', lambda: data['moves'].action_post())
+        self._measure(results, 'payment posting', lambda: data['payments'].action_post())
+        self._measure(results, 'queue processing', lambda: (Queue._flush_enqueued(), Queue._process_queue(
+            limit=len(data['moves']) * 2 or 1)))
+
+        commissions = Commission.search([('fiscal_year_id', '=', data['fiscal_year'].id)])
+        self.assertEqual(len(commissions), self.partners)
+        self._measure(results, 'recompute', lambda: commissions.recompute_all())
+        self.assertTrue(all(commissions.mapped('total_purchase')))
+        self.assertTrue(all(commissions.mapped('total_own_product_purchase')))
+        self.assertTrue(commissions.filtered('commission_rule_id'))
+        self._measure(results, 'rule assignment', lambda: commissions.action_update_commission_rules())
+        self._measure(results, 'list view read', lambda: Commission.web_search_read(
+            [('fiscal_year_id', '=', data['fiscal_year'].id)],
+            {fname: {} for fname in ('partner_id', 'fiscal_year_id', 'total_purchase',
+                                     'total_own_product_purchase', 'total_invoiced', 'total_paid',
+                                     'total_due', 'commission_rule_id', 'commission_amount',
+                                     'payment_date', 'state')},
+            limit=80))
+        self._measure(results, 'ledger rebuild', lambda: self.env['customer.commission.ledger']._rebuild(
+            data['fiscal_year']))
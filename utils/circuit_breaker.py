@@ -0,0 +1,133 @@
+from collections import deque
+import http.client
+import threading
+import time
+import xmlrpc.client
+
+from .sync_metrics import sync_metrics
+
+# a call slower than this counts as a failure
+SLOW_CALL_SECONDS = 10
+# the circuit opens when at least FAILURE_RATIO of the last WINDOW calls failed
+WINDOW = 20
+MIN_CALLS = 5
+FAILURE_RATIO = 0.5
+# seconds the circuit stays open before a probe call is let through
+OPEN_SECONDS = 30
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class RemoteUnavailable(Exception):
+    """Raised instead of calling the remote server while the circuit is open."""
+
+
+# errors meaning the remote server could not be reached, as opposed to xmlrpc
+# faults raised by the server itself
+CONNECTION_ERRORS = (RemoteUnavailable, OSError, http.client.HTTPException, xmlrpc.client.ProtocolError)
+
+
+class CircuitBreaker:
+    """Track the outcome and latency of the recent calls to a remote server,
+    shared by the threads of a worker. After too many failures the circuit
+    opens and calls fail immediately; once OPEN_SECONDS elapsed a single probe
+    call is let through and closes the circuit again when it succeeds."""
+
+    def __init__(self):
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.results = deque(maxlen=WINDOW)
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """Whether a call may be sent now, a half-open circuit lets one probe through"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= OPEN_SECONDS:
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def is_available(self):
+        """Whether calls are expected to go through, without claiming the probe"""
+        with self._lock:
+            return self.state == CLOSED or (
+                self.state == OPEN and time.monotonic() - self.opened_at >= OPEN_SECONDS)
+
+    def record(self, success, latency=0.0):
+        success = success and latency < SLOW_CALL_SECONDS
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if success:
+                    self.state = CLOSED
+                    self.results.clear()
+                else:
+                    self.state = OPEN
+                    self.opened_at = time.monotonic()
+                return
+            self.results.append(success)
+            failures = self.results.count(False)
+            if len(self.results) >= MIN_CALLS and failures / len(self.results) >= FAILURE_RATIO:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def call(self, func, *args):
+        if not self.allow_request():
+            raise RemoteUnavailable("The external server is unavailable, the call is postponed")
+        start = time.monotonic()
+        try:
+            result = func(*args)
+        except xmlrpc.client.Fault:
+            # the server answered with an application error, it is up
+            self.record(True, time.monotonic() - start)
+            raise
+        except Exception:
+            # connection errors, and any other error such as a response that
+            # cannot be parsed, count as failures: a probe always settles the
+            # half-open circuit, whatever it raises
+            self.record(False, time.monotonic() - start)
+            raise
+        self.record(True, time.monotonic() - start)
+        return result
+
+
+class GuardedServerProxy:
+    """ServerProxy wrapper sending execute_kw calls through a circuit breaker,
+    and recording them in the sync metrics"""
+
+    def __init__(self, proxy, breaker):
+        self._proxy = proxy
+        self._breaker = breaker
+
+    def execute_kw(self, *args):
+        transport = self._proxy('transport')
+        transport.last_request_size = transport.last_response_size = 0
+        error = rejected = False
+        start = time.monotonic()
+        try:
+            return self._breaker.call(self._proxy.execute_kw, *args)
+        except RemoteUnavailable:
+            rejected = True
+            raise
+        except Exception:
+            error = True
+            raise
+        finally:
+            # args are (db, uid, password, model, method, ...)
+            sync_metrics.record(args[3], args[4], time.monotonic() - start, transport.last_request_size,
+                                transport.last_response_size, error=error, rejected=rejected)
+
+    def __getattr__(self, name):
+        return getattr(self._proxy, name)
+
+
+def get_circuit_breaker(key):
+    """Circuit breaker of a remote server, key identifies the server (url, db)"""
+    with _breakers_lock:
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker()
+        return _breakers[key]
@@ -0,0 +1,40 @@
+PRODUCT_PRICE_FIELDS = ('list_price', 'standard_price')
+PRICELIST_ITEM_PRICE_FIELDS = ('fixed_price',)
+TRANSACTION_PRICE_FIELDS = ('price_unit',)
+
+
+def command_vals(commands):
+    """Values dicts of the create and update commands of an x2many value"""
+    return [command[2] for command in commands or []
+            if len(command) > 2 and command[0] in (0, 1) and isinstance(command[2], dict)]
+
+
+class PriceTransform:
+    """Decrease of the prices mirrored to the external database. It is
+    configured once per batch and applied to whole columns of values: product
+    and pricelist prices are decreased by the product percentage, order line
+    prices by the transaction percentage."""
+
+    def __init__(self, product_percentage=0.0, transaction_percentage=0.0):
+        self.product_factor = 1 - (product_percentage or 0.0) / 100
+        self.transaction_factor = 1 - (transaction_percentage or 0.0) / 100
+
+    @staticmethod
+    def _scale(rows, fnames, factor):
+        if factor == 1:
+            return rows
+        for fname in fnames:
+            column = [row for row in rows if row.get(fname)]
+            for row, value in zip(column, [row[fname] * factor for row in column]):
+                row[fname] = value
+        return rows
+
+    def product_prices(self, rows, fnames=PRODUCT_PRICE_FIELDS):
+        """Decrease the product prices of the values dicts of rows, in place"""
+        return self._scale(rows, fnames, self.product_factor)
+
+    def pricelist_item_prices(self, rows):
+        return self._scale(rows, PRICELIST_ITEM_PRICE_FIELDS, self.product_factor)
+
+    def transaction_prices(self, rows):
+        return self._scale(rows, TRANSACTION_PRICE_FIELDS, self.transaction_factor)
@@ -0,0 +1,52 @@
+from collections import OrderedDict
+import threading
+import time
+
+DEFAULT_TTL = 600
+DEFAULT_MAX_SIZE = 4096
+
+
+class RemoteLookupCache:
+    """Bounded LRU cache with expiry for the IDs of remote reference records
+    (attributes, currencies, companies, packagings...), shared by the threads
+    of a worker. Keys start with the model name so that the entries of a model
+    can be invalidated together."""
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, ttl=DEFAULT_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        """Return the cached value of key, or None when missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + (ttl or self.ttl))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, model_name=None):
+        """Drop the entries of a model, or all the entries."""
+        with self._lock:
+            if model_name is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key[0] == model_name]:
+                del self._entries[key]
+
+
+remote_lookup_cache = RemoteLookupCache()
@@ -0,0 +1,61 @@
+import threading
+import xmlrpc.client
+
+DEFAULT_TIMEOUT = 30
+
+# ServerProxy objects are not thread safe, every worker thread keeps its own pool
+_pool = threading.local()
+
+
+class TimeoutTransportMixin:
+    """Keep-alive transport applying a socket timeout to its connection. The
+    parent Transport caches one HTTP/1.1 connection per host and reuses it for
+    every request, reconnecting transparently when the server closed it."""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, **kwargs):
+        super().__init__(**kwargs)
+        self.timeout = timeout
+        # sizes of the last request and response, for the sync metrics
+        self.last_request_size = self.last_response_size = 0
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self.timeout
+        return connection
+
+    def send_content(self, connection, request_body):
+        self.last_request_size = len(request_body)
+        super().send_content(connection, request_body)
+
+    def parse_response(self, response):
+        self.last_response_size = int(response.getheader('content-length', 0) or 0)
+        return super().parse_response(response)
+
+
+class TimeoutTransport(TimeoutTransportMixin, xmlrpc.client.Transport):
+    pass
+
+
+class TimeoutSafeTransport(TimeoutTransportMixin, xmlrpc.client.SafeTransport):
+    pass
+
+
+def get_server_proxy(url, endpoint='object', timeout=DEFAULT_TIMEOUT):
+    """Pooled ServerProxy for the XML-RPC endpoint of an Odoo server, shared by
+    all the calls of the current worker thread."""
+    proxies = getattr(_pool, 'proxies', None)
+    if proxies is None:
+        proxies = _pool.proxies = {}
+    key = (url, endpoint, timeout)
+    if key not in proxies:
+        transport_class = TimeoutSafeTransport if url.startswith('https') else TimeoutTransport
+        proxies[key] = xmlrpc.client.ServerProxy(
+            f'{url}/xmlrpc/2/{endpoint}', transport=transport_class(timeout=timeout), allow_none=True)
+    return proxies[key]
+
+
+def clear_server_proxies():
+    """Close and drop the pooled connections of the current worker thread."""
+    for proxy in getattr(_pool, 'proxies', {}).values():
+        proxy('close')()
+    _pool.proxies = {}
@@ -0,0 +1,78 @@
+from collections import defaultdict
+import bisect
+import threading
+import time
+
+# upper bounds in seconds of the latency histogram buckets, the last bucket is unbounded
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNTERS = ('calls', 'error_count', 'rejected_count', 'request_bytes', 'response_bytes', 'latency_total')
+# stats are written to the database at most this often by each worker
+FLUSH_INTERVAL = 60
+
+
+def _new_stats():
+    return dict(dict.fromkeys(COUNTERS, 0), buckets=[0] * (len(LATENCY_BUCKETS) + 1))
+
+
+def histogram_percentile(buckets, quantile):
+    """Estimate a latency percentile in seconds from the counts of the
+    histogram buckets, interpolating linearly inside the bucket."""
+    total = sum(buckets)
+    if not total:
+        return 0.0
+    rank = quantile * total
+    seen = 0
+    for index, count in enumerate(buckets):
+        if count and seen + count >= rank:
+            if index == len(LATENCY_BUCKETS):
+                return float(LATENCY_BUCKETS[-1])
+            lower = LATENCY_BUCKETS[index - 1] if index else 0.0
+            return lower + (LATENCY_BUCKETS[index] - lower) * (rank - seen) / count
+        seen += count
+    return float(LATENCY_BUCKETS[-1])
+
+
+class SyncMetrics:
+    """Counters of the remote calls of a worker per (model, method), kept in
+    memory and periodically moved to the db.sync.metric table."""
+
+    def __init__(self):
+        self._stats = defaultdict(_new_stats)
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def record(self, model_name, method, latency, request_bytes=0, response_bytes=0, error=False, rejected=False):
+        with self._lock:
+            stats = self._stats[(model_name, method)]
+            if rejected:
+                # refused by the circuit breaker, nothing was sent
+                stats['rejected_count'] += 1
+                return
+            stats['calls'] += 1
+            stats['error_count'] += int(error)
+            stats['request_bytes'] += request_bytes
+            stats['response_bytes'] += response_bytes
+            stats['latency_total'] += latency
+            stats['buckets'][bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+    def flush_due(self):
+        return time.monotonic() - self._last_flush >= FLUSH_INTERVAL
+
+    def pop(self):
+        """Take the stats recorded since the last flush"""
+        with self._lock:
+            stats, self._stats = self._stats, defaultdict(_new_stats)
+            self._last_flush = time.monotonic()
+        return dict(stats)
+
+    def merge(self, stats):
+        """Put back stats that could not be flushed"""
+        with self._lock:
+            for key, values in stats.items():
+                current = self._stats[key]
+                for counter in COUNTERS:
+                    current[counter] += values[counter]
+                current['buckets'] = [a + b for a, b in zip(current['buckets'], values['buckets'])]
+
+
+sync_metrics = SyncMetrics()
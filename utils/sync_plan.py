@@ -0,0 +1,69 @@
+from collections import defaultdict
+import itertools
+import threading
+
+# methods that do not change the remote database, sent during a dry run since
+# their results drive the planned operations
+READ_METHODS = ('search', 'search_read', 'search_count', 'read', 'read_group', 'name_search', 'fields_get')
+# latency assumed in seconds for calls never measured, see db.sync.plan
+DEFAULT_LATENCY = 0.25
+
+
+class SyncPlan:
+    """Remote calls of a dry run per (model, method): the reads are sent and
+    the writes only recorded, see PlanningServerProxy."""
+
+    def __init__(self):
+        self.operations = defaultdict(lambda: {'calls': 0, 'records': 0, 'sent': False})
+        self._lock = threading.Lock()
+        # IDs of the records planned to be created, negative so they never match a remote record
+        self._fake_ids = itertools.count(-1, -1)
+
+    def record(self, model_name, method, records=0, sent=False):
+        with self._lock:
+            operation = self.operations[(model_name, method)]
+            operation['calls'] += 1
+            operation['records'] += records
+            operation['sent'] = sent
+
+    def fake_ids(self, count):
+        with self._lock:
+            return [next(self._fake_ids) for _index in range(count)]
+
+
+class PlanningServerProxy:
+    """ServerProxy wrapper of a dry run: execute_kw calls reading the remote
+    database go through, the others are recorded in the plan and answered
+    like the server would, e.g. with new IDs for create."""
+
+    def __init__(self, proxy, plan):
+        self._proxy = proxy
+        self._plan = plan
+
+    def execute_kw(self, *args):
+        # args are (db, uid, password, model, method, args, kwargs)
+        model_name, method = args[3], args[4]
+        params = args[5] if len(args) > 5 else []
+        if method in READ_METHODS:
+            result = self._proxy.execute_kw(*args)
+            self._plan.record(model_name, method, len(result) if isinstance(result, list) else 0, sent=True)
+            return result
+        if method == 'create':
+            vals = params[0] if params else {}
+            ids = self._plan.fake_ids(len(vals) if isinstance(vals, list) else 1)
+            self._plan.record(model_name, method, len(ids))
+            return ids if isinstance(vals, list) else ids[0]
+        if method == 'load':
+            fields, rows = params[0], params[1]
+            if '.id' in fields:
+                ids = [int(row[fields.index('.id')]) for row in rows]
+            else:
+                ids = self._plan.fake_ids(len(rows))
+            self._plan.record(model_name, method, len(rows))
+            return {'ids': ids, 'messages': []}
+        ids = params[0] if params and isinstance(params[0], list) else []
+        self._plan.record(model_name, method, len(ids))
+        return True
+
+    def __getattr__(self, name):
+        return getattr(self._proxy, name)